@@ -0,0 +1,327 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+End-to-end RCQC benchmark.  Generates synthetic SPAdes contig fasta files, FastQC reports, FLASH logs and tab-delimited files of increasing size, runs recipes on them with rcqc.py, and records wall time, throughput and peak memory (RSS) of each run in a JSON results file.  Results from another version of the code can be compared with --compare.
+
+Generated files are kept in the work folder (-w) and reused by later runs, since they are always generated the same way for a given size.
+"""
+
+import datetime
+import optparse
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+try: #Python 2.7
+	from collections import OrderedDict
+except ImportError: # Python 2.6
+	from ordereddict import OrderedDict
+
+try:
+	import simplejson as json
+except ImportError: # Python 2.6
+	import json
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+RCQC_PATH = os.path.join(os.path.dirname(BENCHMARK_FOLDER), 'rcqc.py')
+RECIPE_FOLDER = os.path.join(os.path.dirname(BENCHMARK_FOLDER), 'recipes')
+BENCHMARK_RECIPE_FOLDER = os.path.join(BENCHMARK_FOLDER, 'recipes')
+
+# Same settings the shipped spades recipes expect via --json.
+SPADES_SETTINGS = '{"report/parameters": {"contig_length_QC_threshold": "0", "reference_genome_size": "4857000", "genome_size_ratio_QC_threshold":"0.1","contig_N50_QC_threshold":"200000","contig_N99_QC_threshold":"2000","contig_count_QC_threshold":"200"}}'
+
+FASTQC_MODULES = [
+	# (name, state, columns header or None for a fixed Basic Statistics block)
+	('Basic Statistics', 'pass', None),
+	('Per base sequence quality', 'pass', '#Base\tMean\tMedian\tLower Quartile\tUpper Quartile\t10th Percentile\t90th Percentile'),
+	('Per sequence quality scores', 'pass', '#Quality\tCount'),
+	('Per base sequence content', 'fail', '#Base\tG\tA\tT\tC'),
+	('Per base GC content', 'fail', '#Base\t%GC'),
+	('Per sequence GC content', 'pass', '#GC Content\tCount'),
+	('Per base N content', 'pass', '#Base\tN-Count'),
+	('Sequence Length Distribution', 'warn', '#Length\tCount'),
+	('Sequence Duplication Levels', 'warn', '#Duplication Level\tRelative count'),
+	('Overrepresented sequences', 'pass', '#Sequence\tCount\tPercentage\tPossible Source'),
+	('Kmer Content', 'warn', '#Sequence\tCount\tObs/Exp Overall\tObs/Exp Max\tMax Obs/Exp Position')
+]
+
+
+class MyParser(optparse.OptionParser):
+	"""
+	Allows formatted help info.  From http://stackoverflow.com/questions/1857346/python-optparse-how-to-include-additional-info-in-usage-output.
+	"""
+	def format_epilog(self, formatter):
+		return self.epilog
+
+
+def stop_err( msg, exit_code=1 ):
+	sys.stderr.write("%s\n" % msg)
+	sys.exit(exit_code)
+
+
+def writeFastaFile(file_path, size, seed=1):
+	"""
+	Writes SPAdes style assembly of size contigs, longest first, with "NODE_N length_X_cov_Y_ID_Z" headers and 60 bases per line.  Contig lengths are log-normal (median about 250bp, minimum 128bp), as in a fragmented assembly.  Returns item count.
+	"""
+	rng = random.Random(seed)
+	pool = ''.join(rng.choice('ACGT') for ptr in xrange(1048576)) # Sequence is sliced from this pool.
+	lengths = sorted((min(500000, max(128, int(rng.lognormvariate(5.5, 0.9)))) for ptr in xrange(size)), reverse=True)
+
+	with open(file_path, 'w', 1048576) as output_handle:
+		for (ptr, length) in enumerate(lengths):
+			output_handle.write('>NODE_%s length_%s_cov_%.5g_ID_%s\n' % (ptr + 1, length, rng.uniform(1, 200), 2 * ptr + 1))
+			start = rng.randint(0, len(pool) - length)
+			sequence = pool[start:start + length]
+			output_handle.writelines(sequence[line:line + 60] + '\n' for line in xrange(0, length, 60))
+
+	return size
+
+
+def writeFastQCFile(file_path, size, seed=1):
+	"""
+	Writes FastQC report (fastqc_data.txt) whose module data rows total about size lines.  Returns item count.
+	"""
+	rng = random.Random(seed)
+	rows = max(1, size // (len(FASTQC_MODULES) - 1)) # Per module having tabular data.
+
+	with open(file_path, 'w', 1048576) as output_handle:
+		output_handle.write('##FastQC\t0.11.5\n')
+		for (name, state, header) in FASTQC_MODULES:
+			output_handle.write('>>%s\t%s\n' % (name, state))
+			if header is None:
+				output_handle.write('#Measure\tValue\nFilename\tsynthetic_R1_001.fastq.gz\nFile type\tConventional base calls\nEncoding\tSanger / Illumina 1.9\nTotal Sequences\t%s\nFiltered Sequences\t0\nSequence length\t35-251\n%%GC\t38\n' % (rows * 1000))
+			else:
+				output_handle.write(header + '\n')
+				columns = header.count('\t')
+				for row in xrange(rows):
+					if name in ('Overrepresented sequences', 'Kmer Content'):
+						label = ''.join(rng.choice('ACGT') for ptr in xrange(50 if name[0] == 'O' else 7))
+					else:
+						label = str(row + 1)
+					output_handle.write(label + ''.join('\t%.5f' % rng.uniform(0, 40) for ptr in xrange(columns)) + '\n')
+			output_handle.write('>>END_MODULE\n')
+
+	return size
+
+
+def writeFlashFile(file_path, size, seed=1):
+	"""
+	Writes FLASH read pair merging log having size "Processed N read pairs" progress lines, followed by read combination statistics.  Returns item count.
+	"""
+	rng = random.Random(seed)
+	pairs = size * 25000
+	combined = int(pairs * rng.uniform(0.6, 0.95))
+
+	with open(file_path, 'w', 1048576) as output_handle:
+		output_handle.write('[FLASH] Starting FLASH v1.2.11\n[FLASH] Fast Length Adjustment of SHort reads\n[FLASH]  \n[FLASH] Input files:\n[FLASH]     synthetic_R1_001.fastq.gz\n[FLASH]     synthetic_R2_001.fastq.gz\n[FLASH]  \n[FLASH] Parameters:\n[FLASH]     Min overlap:           10\n[FLASH]     Max overlap:           65\n[FLASH]     Max mismatch density:  0.250000\n[FLASH]  \n[FLASH] Starting reader and writer threads\n[FLASH] Starting 4 combiner threads\n')
+		output_handle.writelines('[FLASH] Processed %s read pairs\n' % ((row + 1) * 25000) for row in xrange(size))
+		output_handle.write('[FLASH]  \n[FLASH] Read combination statistics:\n[FLASH]     Total pairs:      %s\n[FLASH]     Combined pairs:   %s\n[FLASH]     Uncombined pairs: %s\n[FLASH]     Percent combined: %.2f%%\n[FLASH]  \n[FLASH] FLASH v1.2.11 complete!\n[FLASH] %.3f seconds elapsed\n[FLASH] Finished with 0 warnings (see above)\n' % (pairs, combined, pairs - combined, 100.0 * combined / pairs, size * 0.01))
+
+	return size
+
+
+def writeTabularFile(file_path, size, seed=1):
+	"""
+	Writes tab-delimited contig table with header row and size rows.  Returns item count.
+	"""
+	rng = random.Random(seed)
+	states = ['pass', 'warn', 'fail']
+
+	with open(file_path, 'w', 1048576) as output_handle:
+		output_handle.write('id\tname\tlength\tcoverage\tGC content\tstatus\n')
+		output_handle.writelines('%s\tNODE_%s\t%s\t%.5g\t%.2f\t%s\n' % (row + 1, row + 1, rng.randint(128, 500000), rng.uniform(1, 200), rng.uniform(30, 70), rng.choice(states)) for row in xrange(size))
+
+	return size
+
+
+# name: (input generator, file suffix, input file type, recipe, recipe arguments)
+BENCHMARKS = OrderedDict([
+	('spades_contigs', (writeFastaFile, 'fasta', 'fasta', os.path.join(RECIPE_FOLDER, 'spades_contigs.json'), ['-j', SPADES_SETTINGS, '-O', 'Reporting'])),
+	('spades_filtered_repeat_contigs', (writeFastaFile, 'fasta', 'fasta', os.path.join(RECIPE_FOLDER, 'spades_filtered_repeat_contigs.json'), ['-j', SPADES_SETTINGS])),
+	('fastqc_modules', (writeFastQCFile, 'txt', 'txt', os.path.join(BENCHMARK_RECIPE_FOLDER, 'fastqc_modules.json'), [])),
+	('fastqc_index', (writeFastQCFile, 'txt', 'txt', os.path.join(BENCHMARK_RECIPE_FOLDER, 'fastqc_index.json'), [])),
+	('flash_log', (writeFlashFile, 'log', 'txt', os.path.join(BENCHMARK_RECIPE_FOLDER, 'flash_log.json'), [])),
+	('tabular_import', (writeTabularFile, 'tabular', 'tabular', os.path.join(BENCHMARK_RECIPE_FOLDER, 'tabular_import.json'), [])),
+	('tabular_columns', (writeTabularFile, 'tabular', 'tabular', os.path.join(BENCHMARK_RECIPE_FOLDER, 'tabular_columns.json'), []))
+])
+
+
+class RCQCBenchmark(object):
+
+	def __init__(self):
+		self.options = None
+		self.results = None
+
+
+	def __main__(self):
+		options, args = self.get_command_line()
+		self.options = options
+
+		names = map(str.strip, options.benchmarks.strip().strip(',').split(',')) if options.benchmarks else BENCHMARKS.keys()
+		for name in names:
+			if not name in BENCHMARKS:
+				stop_err('Error: no benchmark named "%s".  Benchmarks are: %s' % (name, ', '.join(BENCHMARKS.keys())))
+		sizes = [int(size) for size in options.sizes.strip().strip(',').split(',')]
+
+		if not os.path.isdir(options.work_folder):
+			os.makedirs(options.work_folder)
+
+		self.results = OrderedDict()
+		self.results['title'] = "RCQC Benchmark Results"
+		self.results['tool_version'] = self.getToolVersion()
+		self.results['date'] = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M')
+		self.results['python'] = platform.python_version()
+		self.results['platform'] = platform.platform()
+		self.results['rcqc'] = options.rcqc_path
+		self.results['rcqc_args'] = options.rcqc_args
+		self.results['repeats'] = options.repeats
+		self.results['runs'] = []
+
+		for name in names:
+			for size in sizes:
+				result = self.runBenchmark(name, size)
+				self.results['runs'].append(result)
+				print "%(name)s %(size)s: %(seconds).3f seconds, %(mb_per_second).2f MB/s, %(items_per_second)d items/s, peak RSS %(peak_rss_kb)s KB, exit code %(exit_code)s" % result
+
+		with (open(options.output_file, 'w') if options.output_file else sys.stdout) as output_handle:
+			output_handle.write(json.dumps(self.results, sort_keys=False, indent=4, separators=(',', ': ')) + '\n')
+
+		if options.compare_file:
+			self.compareResults(options.compare_file)
+
+		failures = [result for result in self.results['runs'] if result['exit_code'] > 2]
+		if failures:
+			stop_err('%s of %s benchmark runs failed; see their rcqc.py logs in %s' % (len(failures), len(self.results['runs']), options.work_folder))
+
+
+	def getToolVersion(self):
+		"""
+		Returns CODE_VERSION of rcqc.py being benchmarked.
+		"""
+		output = subprocess.Popen([sys.executable, self.options.rcqc_path, '-v'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.options.work_folder).communicate()[0]
+		return output.strip().split('\n')[-1]
+
+
+	def getInputFile(self, name, size):
+		"""
+		Returns (path, item count, byte count) of benchmark's generated input file, generating it if it isn't in work folder yet.
+		"""
+		(generator, suffix, file_type, recipe, recipe_args) = BENCHMARKS[name]
+		file_path = os.path.join(self.options.work_folder, '%s_%s.%s' % (generator.__name__[5:-4].lower(), size, suffix))
+		if not os.path.isfile(file_path):
+			print "Generating %s ..." % file_path
+			temp_path = file_path + '.tmp'
+			generator(temp_path, size)
+			os.rename(temp_path, file_path) # So an interrupted run doesn't leave a partial file to reuse.
+
+		return (file_path, size, os.path.getsize(file_path))
+
+
+	def runBenchmark(self, name, size):
+		"""
+		Runs benchmark's recipe on input file of given size -r times, and returns result of fastest run.
+		"""
+		(generator, suffix, file_type, recipe, recipe_args) = BENCHMARKS[name]
+		(file_path, items, input_bytes) = self.getInputFile(name, size)
+		run_name = '%s_%s' % (name, size)
+		output_path = os.path.join(self.options.work_folder, run_name + '.json')
+		log_path = os.path.join(self.options.work_folder, run_name + '.log')
+		command = [sys.executable, self.options.rcqc_path, '-r', recipe, '-i', '%s:%s:%s' % (file_path, os.path.basename(file_path), file_type), '-o', output_path] + recipe_args
+		if self.options.rcqc_args:
+			command.extend(self.options.rcqc_args.split())
+
+		timings = []
+		for repeat in range(self.options.repeats):
+			timings.append(self.runCommand(command, log_path))
+
+		(seconds, peak_rss_kb, exit_code) = min(timings)
+
+		result = OrderedDict()
+		result['name'] = name
+		result['size'] = size
+		result['recipe'] = os.path.basename(recipe)
+		result['input_bytes'] = input_bytes
+		result['items'] = items
+		result['exit_code'] = exit_code
+		result['seconds'] = round(seconds, 4)
+		result['all_seconds'] = [round(timing[0], 4) for timing in timings]
+		result['mb_per_second'] = round(input_bytes / 1048576.0 / seconds, 3) if seconds else None
+		result['items_per_second'] = round(items / seconds, 1) if seconds else None
+		result['peak_rss_kb'] = peak_rss_kb
+		return result
+
+
+	def runCommand(self, command, log_path):
+		"""
+		Runs rcqc.py command in work folder, with its stdout and stderr going to log file.  Returns (wall time seconds, peak RSS kilobytes, exit code).  Peak RSS comes from operating system's resource usage of finished process (ru_maxrss, which Linux reports in kilobytes).
+		"""
+		with open(log_path, 'w') as log_handle:
+			start = timeit.default_timer()
+			process = subprocess.Popen(command, stdout=log_handle, stderr=subprocess.STDOUT, cwd=self.options.work_folder)
+			(pid, status, usage) = os.wait4(process.pid, 0)
+			seconds = timeit.default_timer() - start
+			process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+		peak_rss_kb = usage.ru_maxrss if sys.platform != 'darwin' else usage.ru_maxrss // 1024
+		return (seconds, peak_rss_kb, process.returncode)
+
+
+	def compareResults(self, compare_file_path):
+		"""
+		Prints each run's time and peak RSS next to same run in a previous results file, with ratio of new to old.
+		"""
+		with open(compare_file_path, 'r') as compare_handle:
+			previous = json.load(compare_handle, object_pairs_hook=OrderedDict)
+
+		previous_runs = dict(((run['name'], run['size']), run) for run in previous['runs'])
+		print "Compared with %s (version %s, %s):" % (compare_file_path, previous.get('tool_version', ''), previous.get('date', ''))
+		print "run\told seconds\tnew seconds\ttime ratio\told peak RSS KB\tnew peak RSS KB\tRSS ratio"
+		for run in self.results['runs']:
+			old_run = previous_runs.get((run['name'], run['size']), None)
+			if old_run is None:
+				continue
+			print '%s_%s\t%s\t%s\t%.2f\t%s\t%s\t%.2f' % (run['name'], run['size'], old_run['seconds'], run['seconds'], run['seconds'] / old_run['seconds'] if old_run['seconds'] else 0, old_run['peak_rss_kb'], run['peak_rss_kb'], float(run['peak_rss_kb']) / old_run['peak_rss_kb'] if old_run['peak_rss_kb'] else 0)
+
+
+	def get_command_line(self, args=None):
+		"""
+		*************************** Parse Command Line *****************************
+		"""
+		parser = MyParser(
+			description = 'Generates synthetic inputs, runs RCQC recipes on them, and records wall time, throughput and peak memory of each run.',
+			usage = 'rcqc_benchmark.py [options]',
+			epilog="""
+	Benchmarks are: %s
+	Example: python benchmarks/rcqc_benchmark.py -s 1000,10000 -o results.json --compare previous_results.json
+	""" % ', '.join(BENCHMARKS.keys()))
+
+		parser.add_option('-b', '--benchmarks', type='string', dest='benchmarks', default='', help='Comma-separated list of benchmarks to run.  Defaults to all.')
+
+		parser.add_option('-s', '--sizes', type='string', dest='sizes', default='1000,10000,100000,1000000', help='Comma-separated input sizes: contigs of fasta file, data rows of FastQC report, progress lines of FLASH log, or rows of tabular file.  A 1000000 contig fasta file is roughly 400 MB.  Defaults to 1000,10000,100000,1000000.')
+
+		parser.add_option('-r', '--repeats', type='int', dest='repeats', default=1, help='Run each benchmark this many times, keeping fastest run.')
+
+		parser.add_option('-o', '--output', type='string', dest='output_file', help='Write JSON results to this file, or to stdout if none given.')
+
+		parser.add_option('-w', '--work_folder', type='string', dest='work_folder', default=os.path.join(os.getcwd(), 'rcqc_benchmark_data'), help='Generated input files, reports and logs go in this folder.  Defaults to rcqc_benchmark_data/ in working folder.')
+
+		parser.add_option('--rcqc', type='string', dest='rcqc_path', default=RCQC_PATH, help='Benchmark this rcqc.py, e.g. of another version.  Defaults to rcqc.py next to benchmarks/ folder.')
+
+		parser.add_option('-a', '--args', type='string', dest='rcqc_args', default='', help='Additional space-separated options for each rcqc.py run, e.g. "--compact -P 4".')
+
+		parser.add_option('-c', '--compare', type='string', dest='compare_file', help='Compare results with this previous results file.')
+
+		(options, args) = parser.parse_args(args)
+		options.work_folder = os.path.abspath(options.work_folder)
+		options.rcqc_path = os.path.abspath(options.rcqc_path)
+		return (options, args)
+
+
+if __name__ == '__main__':
+
+	benchmark = RCQCBenchmark()
+	benchmark.__main__()
@@ -1,16 +1,26 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import collections
 import datetime
 import glob
+import hashlib
+import inspect
 import operator
 import optparse
 import math
+import multiprocessing
 import os
 import pyparsing
 import re
+import socket
+import SocketServer
+import StringIO
 import sys
 import numbers
+import tempfile
+import timeit
+import traceback
 
 try: #Python 2.7
 	from collections import OrderedDict
@@ -22,12 +32,21 @@ try:
 except ImportError: # Python 2.6
     	import json
 
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
 # These three classes, plus self.functions below, provide all of the functions available in rules to massage report data
 from rcqc_functions.rcqc_functions import RCQCClassFnExtension
 from rcqc_functions.rcqc_functions import RCQCStaticFnExtension
+from rcqc_functions.rcqc_functions import REGEXP_CACHE_STATS
+from rcqc_functions.rcqc_functions import FILE_CACHE_STATS
 
 CODE_VERSION = '0.1.1'
 DEBUG = 0
+# Number of paths each of getNamespace() and namespaceReadValue() keep resolved, least recently used first.  Paths formatted per row, e.g. store locations with %(name)s, would otherwise add one each.
+PATH_CACHE_SIZE = 1024
 # 3 place infix operators e.g. "a < b" conversion to equivalent "lt(a b)" phrase.  
 # Allowing all items with < and > in them to be referenced as gt lt etc.
 RCQC_OPERATOR_2 = { '-':'neg', 'not':'not_' }
@@ -48,6 +67,27 @@ RCQC_OPERATOR_3 = {
 	'%':'mod'
 } 
 
+# In-place operator functions store their result back into their first parameter's namespace location.
+RCQC_INPLACE_FUNCTIONS = ['iconcat','iadd','iand','idiv','ifloordiv','ilshift','imod','imul','ior','ipow','irepeat','irshift','isub','itruediv','ixor', 'clear','iStatBP']
+
+# Functions whose parameters aren't all evaluated before the function is called:
+#  'conditional': 1st parameter decides whether the remaining ones are evaluated (see evaluateParams)
+#  'after_first': only 1st parameter is evaluated
+#  'all': no parameters are evaluated
+RCQC_LAZY_FUNCTIONS = {
+	'if': 'conditional', 'iif': 'conditional',
+	'getitem': 'after_first', 'iterate': 'after_first', 'parallelIterate': 'after_first',
+	'note': 'all', 'function': 'all'
+}
+
+# Position of parameter that is a namespace location to store to, and so is never read as a value.
+RCQC_LOCATION_PARAMETER = {'store': 2, '=': 1, 'exists': 1}
+
+# Registry entry for each function available to rules.  Built once; see getFunctionRegistry().
+RCQCFunction = collections.namedtuple('RCQCFunction', 'name fn static inplace argcount min_argcount spec lazy location_param')
+RCQC_FUNCTION_REGISTRY = None
+
+
 
 class MyParser(optparse.OptionParser):
 	"""
@@ -60,6 +100,72 @@ def stop_err( msg, exit_code=1 ):
 	sys.stderr.write("%s\n" % msg)
 	sys.exit(exit_code)
 
+def getFunctionSpec(name, fn, argcount, static=True):
+	"""
+	Returns registry entry for a rule function.  Its documentation's first line, e.g. "fail(location=report/job, message='') -- ...", shows which parameters are optional.
+	"""
+	function_spec = fn.__doc__.strip().split('\n',1)[0] if fn.__doc__ else name + '()'
+	optionals = function_spec.split('--',1)[0].count('=') # indicates optional parameters in definition
+
+	return RCQCFunction(
+		name = name, 
+		fn = fn, 
+		static = static, 
+		inplace = name in RCQC_INPLACE_FUNCTIONS,
+		argcount = argcount, # Number of args as indicated in function documentation, includes optional
+		min_argcount = argcount - optionals,
+		spec = function_spec,
+		lazy = RCQC_LAZY_FUNCTIONS.get(name, None),
+		location_param = RCQC_LOCATION_PARAMETER.get(name, 0)
+	)
+	
+def getFunctionRegistry():
+	"""
+	Returns dictionary of all functions in python operator and math libraries and in RCQC's own function extension classes, keyed by name.  Built on first call only.
+	Lookup order when a name occurs in more than one place: operator, math, RCQCClassFnExtension, RCQCStaticFnExtension.  RCQCInterpreter.functions are added by interpreter after math.
+	SEE ALSO: rcqc_form.py get_function_list()
+	"""
+	global RCQC_FUNCTION_REGISTRY
+	if RCQC_FUNCTION_REGISTRY is None:
+		registry = {}
+
+		for name in dir(RCQCStaticFnExtension):
+			ruleFn = getattr(RCQCStaticFnExtension, name)
+			if name[0:2] != '__' and inspect.isfunction(ruleFn):
+				registry[name] = getFunctionSpec(name, ruleFn, ruleFn.func_code.co_argcount)
+			
+		# These guys get passed an RCQCClassFnExtension instance so they have access to active namespace.
+		for name in dir(RCQCClassFnExtension):
+			ruleFn = getattr(RCQCClassFnExtension, name)
+			if name[0:2] != '__' and inspect.ismethod(ruleFn):
+				registry[name] = getFunctionSpec(name, ruleFn, ruleFn.func_code.co_argcount, False)
+
+		# Utilize built-in python operators
+		for library in [math, operator]:
+			for name in dir(library):
+				ruleFn = getattr(library, name)
+				if name[0:2] != '__' and callable(ruleFn):
+					try:
+						# Only way to determine number of parameters is to pick apart definition doc.
+						fnDef = ruleFn.__doc__ 
+						argcount = fnDef[ fnDef.index(name+'(')+len(name) : fnDef.index(')') ].count(',')+1 
+					except (AttributeError, TypeError, ValueError):
+						continue 
+					registry[name] = getFunctionSpec(name, ruleFn, argcount)
+
+		RCQC_FUNCTION_REGISTRY = registry
+
+	return RCQC_FUNCTION_REGISTRY
+
+# Interpreter shared with batch worker processes when they are forked.
+RCQC_BATCH_INTERPRETER = None
+
+def batchJobWorker(job):
+	"""
+	Runs one batch manifest sample in a worker process.
+	"""
+	return RCQC_BATCH_INTERPRETER.runBatchJob(job)
+
 class RCQCInterpreter(object):
 	"""
 	The RCQCInterpreter class 
@@ -71,27 +177,13 @@ class RCQCInterpreter(object):
 
 		self.version = None
 		self.options = None
-		self.function_stack = [] # stack of functions called, from top-level to currently executing one
-		
-		# namespace includes variables and rules
-		self.namespace = {} # Will be hash list of input files of whatever textual content
-		self.namespace['report'] = OrderedDict()
-		self.namespace['report']['title'] = "RCQC Quality Control Report"			
-		self.namespace['report']['tool_version'] = CODE_VERSION	
-		self.namespace['report']['job'] = {'status': 'ok'}
-		self.namespace['report']['quality_control'] =  {'status': 'ok'}
-
-		self.namespace['sections'] = []
-		self.namespace['rule_index'] = {} # rule index based on location of store(_, location) field. 1 per.
-		self.namespace['name_index'] = {} # index based on last (z) key of x.y.z namespace reference.
-		self.namespace['files'] = [] 
-		self.namespace['file_names'] = {} 
-		self.namespace['iterator'] = {} # Provides the dictionary for each current iterator function evaluation (at call depth). 
-		self.namespace['report_html'] = ''	
-
-		self.input_file_paths = None	
-		self.ruleset_file_path = None	
-		self.output_json_file = None	
+		self.namespace = {}
+		self.resetNamespace()
+
+		self.ruleset_file_path = None
+		self.output_folder = os.getcwd()
+		self.location_templates = {} # Parsed {name} location texts by getLocationTemplate()
+		self.compiled_recipes = None # In server mode, dictionary of compiled recipes by getRulesHash()
 
 		# Really core functions below require access to RCQC class variables.  
 		# Other functions can be added in rcqc_functions RCQCClassFnExtension and RCQCStaticFnExtension classes.
@@ -108,7 +200,55 @@ class RCQCInterpreter(object):
 			'function': lambda x: self.applyRules(x)
 		}
 		
+		# Combined lookup of above functions and library ones.  Operator and math library functions take precedence.
+		self.function_registry = dict(getFunctionRegistry())
+		for (name, ruleFn) in self.functions.items():
+			if not (hasattr(operator, name) or hasattr(math, name)):
+				# Self.functions operate within RCQC object environment, so have "self" as first arg, so we dec arg count.
+				self.function_registry[name] = getFunctionSpec(name, ruleFn, ruleFn.func_code.co_argcount-1)
+
+		self.class_functions = RCQCClassFnExtension(self)
+		
 	
+	def resetNamespace(self):
+		"""
+		Sets up an empty report and job namespace.  Any recipe sections and rule index already loaded are kept, so one interpreter can run several jobs with the same recipe.
+		"""
+		self.function_stack = [] # stack of functions called, from top-level to currently executing one
+
+		# namespace includes variables and rules
+		namespace = {} # Will be hash list of input files of whatever textual content
+		namespace['report'] = OrderedDict()
+		namespace['report']['title'] = "RCQC Quality Control Report"
+		namespace['report']['tool_version'] = CODE_VERSION
+		namespace['report']['job'] = {'status': 'ok'}
+		namespace['report']['quality_control'] =  {'status': 'ok'}
+
+		namespace['sections'] = self.namespace.get('sections', [])
+		namespace['rule_index'] = self.namespace.get('rule_index', {}) # rule index based on location of store(_, location) field. 1 per.
+		namespace['name_index'] = {} # index based on last (z) key of x.y.z namespace reference.
+		namespace['name_collisions'] = {} # number of times a nickname was moved from one existing x.y.z reference to another.
+		namespace['files'] = []
+		namespace['file_names'] = {}
+		namespace['iterator'] = {} # Provides the dictionary for each current iterator function evaluation (at call depth).
+		namespace['report_html'] = ''
+		self.namespace = namespace
+		self.path_cache = {'store': OrderedDict(), 'read': OrderedDict()} # (nickname or None, keys) that getNamespace() and namespaceReadValue() resolved each path to; see cachedPath().
+
+		# Job counters, and with --profile their totals per section and rule
+		self.function_calls = 0
+		self.rows_iterated = 0
+		self.bytes_read = 0 # Size of input files opened by file reading functions.
+		self.profile = None
+		self.appended_lists = None # (id(dictionary), key) of lists, or ids of list nodes, that append() and messageAppend() added to while in a parallelIterate() worker.
+
+		self.closeFileMaps() # Left open if previous job halted.
+
+		self.input_file_paths = None
+		self.output_json_file = None
+		self.output_html_file = None
+
+
 	def __main__(self):
 		"""
 		Applies the interpreter to given rules file and command-line data.
@@ -122,75 +262,317 @@ class RCQCInterpreter(object):
 		global DEBUG
 		options, args = self.get_command_line()
 		self.options = options
-		
+
 		if options.debug:
-			DEBUG = 1	
+			DEBUG = 1
+
+		if options.server_socket_path:
+			self.exitServerClient(options.server_socket_path)
+
+		if options.serve_socket_path:
+			self.serve(options.serve_socket_path)
+			return
+
+		self.startJob()
 
-		_nowabout = datetime.datetime.utcnow() 
-		#self.dateTime = long(_nowabout.strftime("%s"))
-		start_time =  _nowabout.strftime('%Y-%m-%d %H:%M')
-		self.namespace['report']['date'] = start_time
-		print "Generating RCQC report ... " + start_time
-		
 		if options.code_version:
 			print CODE_VERSION
 			return CODE_VERSION
-			
-		if options.daisychain_file_path:
-			with open(options.daisychain_file_path, 'r') as daisychain_handle:
+
+		self.loadOptions(options)
+
+		if options.batch_file_path:
+			self.getRules()
+			self.exitBatch(self.runBatch(options.batch_file_path))
+			return
+
+		# ************ MAIN CONTROL ***************
+		self.getRules()
+		self.runCommandLineJob()
+
+
+	def loadOptions(self, options):
+		"""
+		Sets job output folder and optional sections to execute from command line options.
+		"""
+		self.options = options
+		self.output_folder = options.output_folder if options.output_folder else os.getcwd() #-f [folder]
+		self.optional_sections = map(str.strip, options.optional_sections.strip().strip(",").split(",") ) #cleanup list of execute section(s)
+
+
+	def runCommandLineJob(self):
+		"""
+		Runs job given by command line options (-d, -j, -i, -o, -H) on already loaded recipe, then exits.
+		"""
+		self.loadJobSettings(self.options.daisychain_file_path, self.options.json_object)
+
+		self.output_json_file = self.options.output_json_file #-o [file]
+		self.output_html_file = self.options.output_html_file #-H [file]
+		if self.options.input_file_paths:
+			self.input_file_paths = self.options.input_file_paths.strip()	#-i [string]
+
+		self.runJob()
+		self.exit()
+
+
+	def startJob(self):
+		"""
+		Notes job start time in report.
+		"""
+		self.start_time = datetime.datetime.utcnow()
+		#self.dateTime = long(self.start_time.strftime("%s"))
+		start_time = self.start_time.strftime('%Y-%m-%d %H:%M')
+		self.namespace['report']['date'] = start_time
+		print "Generating RCQC report ... " + start_time
+
+
+	def loadJobSettings(self, daisychain_file_path=None, json_object=None):
+		"""
+		Loads a previous report (-d) into report/ namespace, and JSON settings (-j) into top level namespace.
+		"""
+		if daisychain_file_path:
+			with open(daisychain_file_path, 'r') as daisychain_handle:
 				self.namespace['report'] = json.load(daisychain_handle, object_pairs_hook=OrderedDict)
 				# Nicknames need to be established! # I.e. every dictionary key in report namespace
 				# An existing report may have several sequence sections; this nickname system will only point to last in (ordered!? list).
 				for item in self.namespace['report']:
 					self.setNicknames(item, self.namespace['report'])
-				 
+
 		#NOTE: This flat list of settings are overwritten by any such settings the recipe script establishes.
-		if options.json_object:
-			json_data =  json.loads(options.json_object, object_pairs_hook=OrderedDict ) #OrderedDict preserves order.
+		if json_object:
+			json_data =  json.loads(json_object, object_pairs_hook=OrderedDict ) #OrderedDict preserves order.
 			for item in json_data:
-				# Issue: subsequent programming can rely on nicknames, so each variable read in needs 
+				# Issue: subsequent programming can rely on nicknames, so each variable read in needs
 				# to be entered with store().
 				self.namespace[item] = {}
 				for item2 in json_data[item]:
 					self.storeNamespaceValue(self.getAtomicType(json_data[item][item2]) , item + '/' + item2)
 
-		if options.output_html_file: 
-			self.output_html_file = options.output_html_file 	#-H [file]
-		self.output_folder = options.output_folder if options.output_folder else os.getcwd() #-f [folder]
-		if options.input_file_paths: 
-			self.input_file_paths = options.input_file_paths.strip()	#-i [string]
-
-		self.optional_sections = map(str.strip, options.optional_sections.strip().strip(",").split(",") ) #cleanup list of execute section(s)
 
-		# ************ MAIN CONTROL ***************
-		self.getRules()
-		
+	def runJob(self):
+		"""
+		Executes recipe sections on input files.  Optional sections are executed only if selected.
+		"""
 		if self.input_file_paths:
 			self.getInputFiles()
-			
-		execute_sections = []		
+
+		if self.options and (self.options.profile or self.options.profile_file_path):
+			self.profile = OrderedDict()
+			self.file_cache_stats = dict(FILE_CACHE_STATS) # File cache counters before job.
+
 		for item in self.namespace['sections']:
 			if not 'type' in item or (item['type'] == 'optional' and item['name'] in self.optional_sections):
-				print "Executing: " , item['name'] 
-				self.applyRules(item['name'])
+				print "Executing: " , item['name']
+				if self.profile is None:
+					self.applyRules(item['name'])
+				else:
+					self.profileCall(item['name'], '', None, self.applyRules, item['name'])
 
-		mytimedelta = datetime.datetime.utcnow() -_nowabout
+		if self.profile is not None:
+			self.writeProfile()
+
+		mytimedelta = datetime.datetime.utcnow() - self.start_time
 		print "Completed in %d.%d seconds." % (mytimedelta.seconds, mytimedelta.microseconds)
+		if DEBUG > 0: print "Regular expression cache: %(hits)s hits, %(misses)s misses." % REGEXP_CACHE_STATS
+		if DEBUG > 0: print "File cache: %(hits)s hits, %(misses)s misses, %(bytes_saved)s bytes saved, %(bytes)s bytes cached." % FILE_CACHE_STATS
+		if DEBUG > 0 and self.namespace['name_collisions']: print "Nickname collisions: " + ', '.join('%s (%s)' % item for item in self.namespace['name_collisions'].iteritems())
 
-		self.exit()
+
+	def runBatch(self, batch_file_path):
+		"""
+		Runs already loaded recipe on each sample row of batch manifest file (--batch), resetting namespace between samples.  Samples are run in up to -P worker processes.  Returns list of sample job summaries in manifest order.
+
+		Manifest is tab-delimited text, one sample per line, with columns:
+			input file list (as -i), JSON settings (as -j), output report file (as -o), and optionally output HTML file (as -H) and output folder (as -f).
+		Empty lines and lines starting with # are skipped.
+		"""
+		global RCQC_BATCH_INTERPRETER
+		jobs = []
+		with open(batch_file_path, 'r') as batch_handle:
+			for (row, line) in enumerate(batch_handle):
+				if line.strip() == '' or line[0] == '#':
+					continue
+				columns = line.rstrip('\r\n').split('\t') + ['', '', '', '', '']
+				jobs.append({
+					'row': row,
+					'input': columns[0].strip(),
+					'json': columns[1].strip(),
+					'output': columns[2].strip(),
+					'html': columns[3].strip(),
+					'folder': columns[4].strip()
+				})
+
+		print "Batch of %s samples in %s" % (len(jobs), batch_file_path)
+		processes = min(self.options.processes if self.options.processes else multiprocessing.cpu_count(), len(jobs))
+		if processes > 1:
+			RCQC_BATCH_INTERPRETER = self
+			try:
+				pool = multiprocessing.Pool(processes)
+				try:
+					return pool.map(batchJobWorker, jobs, 1)
+				finally:
+					pool.terminate()
+			finally:
+				RCQC_BATCH_INTERPRETER = None
+
+		return [self.runBatchJob(job) for job in jobs]
+
+
+	def runBatchJob(self, job):
+		"""
+		Runs one batch manifest sample in a fresh namespace, and writes its report.  Returns summary of job's exit code and status.
+		"""
+		self.resetNamespace()
+		self.startJob()
+		self.output_folder = job['folder'] if job['folder'] else (self.options.output_folder if self.options.output_folder else os.getcwd())
+		try:
+			self.loadJobSettings(None, job['json'])
+			self.input_file_paths = job['input'] if job['input'] else None
+			self.output_json_file = job['output'] if job['output'] else None
+			self.output_html_file = job['html'] if job['html'] else None
+			self.runJob()
+			(exit_code, message) = self.finishJob()
+
+		except SystemExit as e: # e.g. stop_err() on missing input file; halts only this sample.
+			exit_code = e.code if isinstance(e.code, int) else 1
+			message = 'Sample job halted.'
+
+		summary = OrderedDict()
+		summary['row'] = job['row']
+		summary['input'] = job['input']
+		summary['output'] = job['output']
+		summary['exit_code'] = exit_code
+		summary['status'] = self.namespace['report']['job']['status']
+		summary['quality_control'] = self.namespace['report']['quality_control']['status']
+		summary['message'] = message
+		return summary
+
+
+	def exitBatch(self, results):
+		"""
+		Writes batch summary (to -o file, or stdout) and exits with 1 if any sample failed, or 2 if any sample requested a retry.
+		"""
+		summary = OrderedDict()
+		summary['title'] = "RCQC Batch Summary"
+		summary['tool_version'] = CODE_VERSION
+		summary['date'] = self.start_time.strftime('%Y-%m-%d %H:%M')
+		summary['jobs'] = results
+
+		exit_codes = [result['exit_code'] for result in results]
+		exit_code = 1 if 1 in exit_codes else (2 if 2 in exit_codes else 0)
+		message = '' if exit_code == 0 else '%s of %s batch sample jobs triggered a workflow %s signal!' % (exit_codes.count(exit_code), len(results), 'fail' if exit_code == 1 else 'retry')
+
+		with (open(self.options.output_json_file,'w') if self.options.output_json_file else sys.stdout) as output_handle:
+			output_handle.write(json.dumps(summary, sort_keys=False, indent=4, separators=(',', ': ')))
+
+		stop_err(message, exit_code)
+
+
+	def serve(self, socket_path):
+		"""
+		Runs as a server (--serve) on given Unix socket until interrupted, taking jobs from rcqc.py clients (--server).  Compiled recipes are kept in memory for reuse by later jobs.  Each job runs in a forked child process, at most -P of them at a time.
+		"""
+		self.compiled_recipes = {}
+		if os.path.exists(socket_path): # Left over from a previous server.
+			os.remove(socket_path)
+
+		server = RCQCServer(socket_path, self)
+		print "RCQC server listening on %s, running up to %s jobs at a time." % (socket_path, server.max_children)
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			server.server_close()
+			os.remove(socket_path)
+
+
+	def loadServerJob(self, request):
+		"""
+		Sets options and recipe for a server job request: a JSON object line with client's working folder ("cwd") and command line arguments ("args").  This happens in the server process, so a newly compiled recipe stays available for later jobs.
+		"""
+		request = json.loads(request)
+		os.chdir(request['cwd'])
+		options, args = self.get_command_line([arg.encode('utf-8') for arg in request['args']]) # As sys.argv would be.
+		self.loadOptions(options)
+		self.getRules()
+
+
+	def runServerJob(self):
+		"""
+		Runs server job set up by loadServerJob() in a fresh namespace.
+		"""
+		self.resetNamespace()
+		self.startJob()
+		self.runCommandLineJob()
+
+
+	def captureServerJob(self, fn, *args):
+		"""
+		Calls fn (part of a server job), returning reply for client with job's exit code, and stdout and stderr text.  Exit code is None if fn didn't exit.
+		"""
+		reply = OrderedDict([('exit_code', None), ('stdout', ''), ('stderr', '')])
+		(stdout, stderr) = (sys.stdout, sys.stderr)
+		sys.stdout = StringIO.StringIO()
+		sys.stderr = StringIO.StringIO()
+		try:
+			fn(*args)
+
+		except SystemExit as e: # exit(), stop_err() and command line errors.
+			reply['exit_code'] = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+			if not isinstance(e.code, (int, type(None))):
+				sys.stderr.write("%s\n" % e.code)
+
+		except Exception:
+			sys.stderr.write(traceback.format_exc())
+			reply['exit_code'] = 1
+
+		finally:
+			reply['stdout'] = sys.stdout.getvalue()
+			reply['stderr'] = sys.stderr.getvalue()
+			(sys.stdout, sys.stderr) = (stdout, stderr)
+
+		return reply
+
+
+	def exitServerClient(self, socket_path):
+		"""
+		Sends this command line job to rcqc server (--server) rather than running it here, then relays job's stdout and stderr text, and exits with its exit code.
+		"""
+		client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			client.connect(socket_path)
+			client.sendall(json.dumps({'cwd': os.getcwd(), 'args': sys.argv[1:]}) + '\n')
+			reply = json.loads(client.makefile('rb').read())
+		except (socket.error, ValueError) as e:
+			stop_err('Unable to run job on RCQC server %s: %s' % (socket_path, e))
+		finally:
+			client.close()
+
+		sys.stdout.write(reply['stdout'])
+		sys.stderr.write(reply['stderr'])
+		sys.exit(reply['exit_code'])
 
 
 	def exit(self, exit_code = 0, message = ''):
 		"""
 		exit(exit_code = 0) -- Stops processing ruleset immediately and exits with given code.  It will finish composing and saving report files first.
 		"""
+		(exit_code, message) = self.finishJob(exit_code, message)
+		stop_err(message, exit_code)
+
+
+	def finishJob(self, exit_code = 0, message = ''):
+		"""
+		Saves report files, and returns final (exit_code, message) for job based on report/job/status .
+		"""
 		location = 'job'
-		
-		if self.options.output_json_file:
-			self.writeJSONReport(self.options.output_json_file)		
-		if self.options.output_html_file:
+
+		if self.output_json_file:
+			self.writeJSONReport(self.output_json_file)
+		if self.output_html_file:
 			self.writeHTMLReport('Report Summary')
-			
+
 		if exit_code == 1:
 			self.storeNamespaceValue("FAIL", 'report/job/status')
 		if exit_code == 2:
@@ -205,8 +587,18 @@ class RCQCInterpreter(object):
 			exit_code = 2
 			message = 'This job quality report triggered a workflow retry signal!'
 
-		self.messageAppend(message, location)					
-		stop_err(message, exit_code)
+		self.messageAppend(message, location)
+		self.closeFileMaps()
+		return (exit_code, message)
+
+
+	def closeFileMaps(self):
+		"""
+		Closes memory maps of input files opened by mmapFileByName() during job, so a --batch or --serve process doesn't keep every job's input files mapped.
+		"""
+		for file_map in getattr(self, 'file_maps', []):
+			file_map.close()
+		self.file_maps = []
 
 	
 	def fail(self, location = 'job', message = ''):
@@ -230,6 +622,8 @@ class RCQCInterpreter(object):
 
 			message = self.namespaceSearchReplace(message)  # could even be a variable?	
 			self.namespace['report'][location]['message'].append(message)
+			if self.appended_lists is not None:
+				self.appended_lists.add( (id(self.namespace['report'][location]), 'message') )
 			
 			
 	def applyRules(self, section_name):
@@ -243,7 +637,60 @@ class RCQCInterpreter(object):
 		if 'rules' in section:
 			for (row, myRule) in enumerate(section['rules']):
 				self.rule_row = row
-				self.evaluateFn(list(myRule)) # Whatever rules might return isn't used.
+				if self.profile is None:
+					self.evaluateFn(list(myRule)) # Whatever rules might return isn't used.
+				else:
+					self.profileCall(section_name, row, myRule, self.evaluateFn, list(myRule))
+
+
+	def profileCall(self, section_name, row, myRule, fn, *args):
+		"""
+		Calls fn(*args), adding its wall time and the function calls, iterated rows and input file bytes it accounted for to the --profile entry for given section and rule row.  Row is '' for a section's total.
+		"""
+		counters = (self.function_calls, self.rows_iterated, self.bytes_read)
+		start = timeit.default_timer()
+		try:
+			return fn(*args)
+		finally:
+			seconds = timeit.default_timer() - start
+			profile_key = (section_name, row)
+			if not profile_key in self.profile:
+				entry = OrderedDict()
+				entry['section'] = section_name
+				entry['row'] = row
+				entry['rule'] = '' if myRule is None else json.dumps(myRule)[0:80]
+				entry['runs'] = 0
+				entry['seconds'] = 0.0
+				entry['calls'] = 0
+				entry['rows'] = 0
+				entry['bytes'] = 0
+				self.profile[profile_key] = entry
+
+			entry = self.profile[profile_key]
+			entry['runs'] += 1
+			entry['seconds'] += seconds
+			entry['calls'] += self.function_calls - counters[0]
+			entry['rows'] += self.rows_iterated - counters[1]
+			entry['bytes'] += self.bytes_read - counters[2]
+
+
+	def writeProfile(self):
+		"""
+		Stores --profile entries in report/job/profile, sorted by cumulative time (a section's time includes its rules), and writes them to --profile_file if given.  The job's file cache hits, misses and bytes saved go in report/job/file_cache .
+		"""
+		entries = sorted(self.profile.itervalues(), key=lambda entry: entry['seconds'], reverse=True)
+		for entry in entries:
+			entry['seconds'] = round(entry['seconds'], 6)
+
+		self.namespace['report']['job']['profile'] = entries
+		file_cache = OrderedDict()
+		for key in ['hits', 'misses', 'bytes_saved']:
+			file_cache[key] = FILE_CACHE_STATS[key] - self.file_cache_stats[key]
+		self.namespace['report']['job']['file_cache'] = file_cache
+
+		if self.options.profile_file_path:
+			with open(self.options.profile_file_path, 'w') as profile_handle:
+				profile_handle.writelines(row['value'] for row in RCQCStaticFnExtension.getTabular(entries))
 
 
 	def evaluateFn(self, myList):
@@ -279,6 +726,7 @@ class RCQCInterpreter(object):
 	def executeFunction(self, childFn, myList):
 	
 		result = None
+		self.function_calls += 1
 		self.function_stack.append(childFn) #Save so subordinate functions have access to their caller
 		# Parameter is a function so evaluate it.  Could get a constant , dict or iterable back.
 		#if True:
@@ -300,8 +748,7 @@ class RCQCInterpreter(object):
 					self.storeNamespaceValue(result, fnObj['argText'][0], False)
 				
 			else: # These functions need access to Report Calc instance's namespace or functions:
-				myobj = RCQCClassFnExtension(self)
-				result = fnObj['fn'](* ([myobj] + fnObj['args']) )
+				result = fnObj['fn'](* ([self.class_functions] + fnObj['args']) )
 				
 			if DEBUG > 0: print "Result: ", result
 
@@ -370,17 +817,14 @@ class RCQCInterpreter(object):
 		while True: 
 			argCt = len(ruleObj['args'])
 			functionName = ruleObj['name']
-			if  argCt < ruleObj['argcount']:
+			if  argCt < ruleObj['min_argcount']:
 				if  len(parameterList) ==  0:
-					function_spec = ruleObj['fn'].__doc__.strip().split('\n',1)[0]
-					optionals = function_spec.split('--',1)[0].count('=') # indicates optional parameters in definition
-					if argCt <  ruleObj['argcount'] - optionals:
-						raise ValueError ('A rule expression needs arguments in rule #' + str(self.rule_row) + ".  \nSee: " + function_spec)
+					raise ValueError ('A rule expression needs arguments in rule #' + str(self.rule_row) + ".  \nSee: " + ruleObj['spec'])
 			
 			if argCt >= 1:
 
 				# For some functions, when first arg is loaded, its truth is evaluated, determining if remaining args are skipped.
-				if functionName in ['if','iif']: 
+				if ruleObj['lazy'] == 'conditional': 
 
 					param1 = ruleObj['args'][0]
 			
@@ -395,10 +839,10 @@ class RCQCInterpreter(object):
 					elif argCt == 2  and functionName == 'iif':
 						skipEval = param1 # Proceed to evaluate 3rd etc argument.
 
-				elif functionName in ['getitem', 'iterate']: 
+				elif ruleObj['lazy'] == 'after_first': 
 					skipEval = True
 			
-			elif functionName in [ 'note', 'function']: 
+			elif ruleObj['lazy'] == 'all': 
 				skipEval = True
 				
 			# Process another parameter if any			
@@ -424,8 +868,7 @@ class RCQCInterpreter(object):
 		  					result = termStr[1:-1]
 
 	  					# When store(value location ...) called, location gets s&r with possible %(...) pattern.
-	  					elif (functionName in ['store'] and parameterCount==2) \
-  							or ( (functionName in ['=','exists']) and parameterCount==1): # ruleObj['inplace'] == True or 
+	  					elif parameterCount == ruleObj['location_param']: # ruleObj['inplace'] == True or 
   							#For a 'store' operation we never want the value of the target variable. 
   							termStr = self.namespaceSearchReplace(termStr, True)
   							result = termStr
@@ -449,49 +892,24 @@ class RCQCInterpreter(object):
 		
 	def matchFunction(self, termStr):
 		"""
-		Attempts to locate given term string to list of various function names in operator 
+		Attempts to locate given term string in function registry, which covers function names in operator 
 		and math library and in RCQC's own Iterable and Noniterable function lists.
-		SEE ALSO: report_calc_form.py get_function_list()
+		Returns a new function object for collecting the arguments of one call, or False if term isn't a function name.
 		"""
-		static = True
-		inplace = False
-		if hasattr(operator, termStr) or hasattr(math, termStr): # Utilize built-in python operators
-			if hasattr(operator, termStr):
-				ruleFn = getattr(operator, termStr)
-			else:
-				ruleFn = getattr(math, termStr)
-			fnDef = ruleFn.__doc__ # Only way to determine number of parameters is to pick apart definition doc.
-			argcount = fnDef[ fnDef.index(termStr+'(')+len(termStr) : fnDef.index(')') ].count(',')+1 
-			
-			if termStr in ['iconcat','iadd','iand','idiv','ifloordiv','ilshift','imod','imul','ior','ipow','irepeat','irshift','isub','itruediv','ixor']:
-				inplace = True
-				
-		elif termStr in self.functions:
-			ruleFn =  self.functions[termStr]
-			# Self.functions operate within RCQC object environment, so have "self" as first arg, so we dec arg count.
-			argcount = ruleFn.func_code.co_argcount-1
-									
-		# These Guys get passed "self" so they have access to active namespace.
-		elif hasattr(RCQCClassFnExtension, termStr):
-			ruleFn = getattr(RCQCClassFnExtension, termStr)
-			argcount = ruleFn.func_code.co_argcount
-			static = False
-			if termStr in ['clear','iStatBP']:
-				inplace = True
-
-		elif hasattr(RCQCStaticFnExtension, termStr): 		
-			ruleFn = getattr(RCQCStaticFnExtension, termStr)
-			argcount = ruleFn.func_code.co_argcount
-			
-		else: 	# Not recognized as a function.  
+		ruleFn = self.function_registry.get(termStr, None)
+		if ruleFn is None: # Not recognized as a function.  
 			return False
 
 		return {
-			'fn': ruleFn, 
-			'static': static,
-			'inplace': inplace,
+			'fn': ruleFn.fn, 
+			'static': ruleFn.static,
+			'inplace': ruleFn.inplace,
 			'name' : termStr,
-			'argcount' : argcount, # Number of args as indicated in function documentation, includes optional
+			'argcount' : ruleFn.argcount, # Number of args as indicated in function documentation, includes optional
+			'min_argcount': ruleFn.min_argcount,
+			'spec': ruleFn.spec,
+			'lazy': ruleFn.lazy,
+			'location_param': ruleFn.location_param,
 			'args':[],
 			'argText':[]
 		}
@@ -558,13 +976,39 @@ class RCQCInterpreter(object):
 		
 		# Handle iterable functions from here on.
 		found = False
-		if '%(' in key: 
+		if '%(' in key and not auxFunctions and '/' in location and not '%' in location[:-len(key)]:
+			# As below, but only last part of location varies, so rows are all stored in obj dictionary without looking up each row's location.
+			keyTemplate = key
+			for myDict in valueObj:
+				found = True
+				self.rows_iterated += 1
+				try:
+					key = keyTemplate % myDict
+				except KeyError:
+					raise KeyError ('Unable to match location term "%s" in dictionary %s:' % (location, str(myDict)) )
+
+				if '/' in key: # Row value adds its own path.
+					(rowObj, rowKey) = self.getNamespace(location[:-len(keyTemplate)] + key)
+					rowObj[rowKey] = myDict['value']
+					continue
+
+				# Nickname as getNamespace() would set it.
+				if not key in obj or not key in self.namespace['name_index']:
+					self.setNickname(obj, key)
+				obj[key] = myDict['value']
+
+			if found:
+				self.namespace['iterator'][fnDepth] = myDict
+				if DEBUG > 0: print "Set separate rows (%s) %s" % (location, valueObj)
+
+		elif '%(' in key: 
 			# Each iterator row result is saved as separate location/key when
 			# location contains {name} parameter to vary each row.
 			# substitution can work on any other named parameters as long as they
 			# are defined in dictionary (e.g. by regex named group search).
  			for myDict in valueObj:
 				found = True
+				self.rows_iterated += 1
 				try: # Run name through search and replace if any '%(foo)s' in it.
 					finalKey = location % myDict  # >= Python 2.6 
 				except KeyError:
@@ -587,6 +1031,7 @@ class RCQCInterpreter(object):
 
 			for myDict in valueObj: 
 				found = True
+				self.rows_iterated += 1
 				self.namespace['iterator'][fnDepth] = myDict #fnDepth needs to be string, not int?
 				#print 'Iteration single array dict at depth:', fnDepth, self.namespace['iterator'][fnDepth]
 				self.evaluateAuxFunctions(auxFunctions)
@@ -625,9 +1070,39 @@ class RCQCInterpreter(object):
 			string
 		"""
 
-		if not isinstance(location, basestring):
+		if not isinstance(location, basestring) or not '{' in location:
 			return location
 
+		parts = []
+		for part in self.getLocationTemplate(location):
+			if isinstance(part, tuple):
+				reference = part[0]
+				newReference = self.namespaceReadValue(reference)
+				#Allow strings and numbers to be substituted in
+				if isinstance(newReference, numbers.Number):
+					newReference = str(newReference) 
+					
+				if not isinstance(newReference, basestring):
+					newReference = '{' + reference + '}' # Left as is.
+				elif reference == newReference and convert == True:
+					# If no change in value then it wasn't recognized in namespace.
+					# So convert it to dictionary lookup %([phrase])s instead.
+					newReference = '%(' + reference + ')s'
+				part = newReference
+
+			parts.append(part)
+	
+		return ''.join(parts)
+
+
+	def getLocationTemplate(self, location):
+		"""
+		Returns location text parsed into a list of literal text and {name} references, the latter as (name,) tuples.  Each location text is parsed only once.
+		"""
+		if location in self.location_templates:
+			return self.location_templates[location]
+
+		template = []
 		ptr = 0
 		while True:
 			startPtr = location.find('{', ptr)
@@ -635,37 +1110,178 @@ class RCQCInterpreter(object):
 			endPtr = location.find('}', startPtr+1)
 			if endPtr == -1: break;
 		
-			reference = location[startPtr+1 : endPtr]
-			newReference = self.namespaceReadValue(reference)
-			#Allow strings and numbers to be substituted in
-			if isinstance(newReference, numbers.Number):
-				newReference = str(newReference) 
-				
-			if isinstance(newReference, basestring):
-				if reference == newReference and convert == True:
-					# If no change in value then it wasn't recognized in namespace.
-					# So convert it to dictionary lookup %([phrase])s instead.
-					newReference = '%(' + reference + ')s'
-				
-				location = location[:startPtr] + newReference + location[endPtr +1:]
+			if startPtr > ptr:
+				template.append(location[ptr:startPtr])
+			template.append( (location[startPtr+1 : endPtr],) )
+			ptr = endPtr + 1
 
-				ptr = startPtr+len(newReference)
-			else:
-				ptr = endPtr 
-	
-		return location
+		if ptr < len(location):
+			template.append(location[ptr:])
+
+		self.location_templates[location] = template
+		return template
+
+
+	def compileLocationTemplates(self, rule):
+		"""
+		Parses every {name} location text in given rule (or recipe sections) ahead of execution.
+		"""
+		if isinstance(rule, basestring):
+			if '{' in rule:
+				self.getLocationTemplate(rule)
+		elif isinstance(rule, list):
+			for item in rule:
+				self.compileLocationTemplates(item)
+		elif isinstance(rule, dict) and 'rules' in rule:
+			self.compileLocationTemplates(rule['rules'])
 
 
 	def getRules(self):
+		"""
+		Loads recipe sections (and any custom rules) into namespace, ready for execution.
+		If a compiled recipe cache folder was given (-C), a previously compiled copy of the same recipe + custom rules + optional sections is reused, or one is saved after compiling.
+		In server mode (--serve) compiled recipes are also kept in memory.
+		"""
+		self.recipe_file_path = self.getRecipeFilePath()
 		
+		recipe_hash = self.getRulesHash() if self.compiled_recipes is not None else None
+		if recipe_hash and recipe_hash in self.compiled_recipes:
+			self.setCompiledRules(self.compiled_recipes[recipe_hash])
+			return
+
+		cache_path = self.getRulesCachePath()
+		if not (cache_path and self.loadRulesCache(cache_path)):
+			self.compileRules()
+			
+			if cache_path:
+				self.saveRulesCache(cache_path)
+
+		self.compileLocationTemplates(self.namespace['sections'])
+
+		if recipe_hash:
+			self.compiled_recipes[recipe_hash] = self.getCompiledRules()
+
+
+	def getRecipeFilePath(self):
+		"""
+		Returns absolute path of recipe file given in options, or None if no recipe was given.
+		"""
 		if self.options.recipe_file_path and self.options.recipe_file_path != 'None':
-			self.recipe_file_path = self.options.recipe_file_path
-			if self.recipe_file_path[0] != '/': # Get absolute path if relative path provided.  Expecting 'recipes/[recipe_name]'
-				self.recipe_file_path = self.getSelfDir() + '/' + self.recipe_file_path
+			recipe_file_path = self.options.recipe_file_path
+			if recipe_file_path[0] != '/': # Get absolute path if relative path provided.  Expecting 'recipes/[recipe_name]'
+				recipe_file_path = self.getSelfDir() + '/' + recipe_file_path
+				
+			if not os.path.exists(recipe_file_path):
+			 	stop_err('Unable to locate the recipe file! \nRecipe file: %s' % recipe_file_path )
+			
+			return recipe_file_path
+		
+		return None
+
+
+	def getRulesCachePath(self):
+		"""
+		Returns path of compiled recipe cache file, named by getRulesHash().
+		Returns None if no cache folder was given, or if modified rules are to be saved (-s).
+		"""
+		recipe_hash = self.getRulesHash()
+		if not self.options.cache_folder or not recipe_hash:
+			return None
+		
+		return os.path.join(self.options.cache_folder, 'rcqc_recipe_%s.pickle' % recipe_hash)
+
+
+	def getRulesHash(self):
+		"""
+		Returns hash of everything that affects rule compilation: code version, recipe file content, custom rules content and optional sections.
+		Returns None if modified rules are to be saved (-s) since that needs a full compile.
+		"""
+		if self.options.save_rules_path:
+			return None
+		
+		content_hash = hashlib.sha1(CODE_VERSION)
+		for file_path in [self.recipe_file_path, self.options.custom_rules]:
+			content_hash.update('\0')
+			if file_path:
+				with open(file_path, 'rb') as file_handle:
+					content_hash.update(file_handle.read())
+					
+		content_hash.update('\0' + ','.join(self.optional_sections))
+		
+		return content_hash.hexdigest()
+
+
+	def loadRulesCache(self, cache_path):
+		"""
+		Loads compiled sections and rule index from cache file.  Returns False if cache file is missing, unreadable or doesn't fit this code version (e.g. it was pickled by another one), so recipe gets compiled instead.
+		"""
+		if not os.path.exists(cache_path):
+			return False
+		
+		try:
+			with open(cache_path, 'rb') as cache_handle:
+				compiled = pickle.load(cache_handle)
+			self.setCompiledRules(compiled)
 				
-			if not os.path.exists(self.recipe_file_path):
-			 	stop_err('Unable to locate the recipe file! \nRecipe file: %s' % self.recipe_file_path )
-			 	
+		except Exception as e: # Unpickling can raise almost anything for a cache from another version.
+			print "Discarding compiled recipe %s (%s: %s), so recompiling." % (cache_path, type(e).__name__, e)
+			return False
+		
+		if DEBUG > 0: print "Loaded compiled recipe: ", cache_path
+		return True
+		
+		
+	def getCompiledRules(self):
+		"""
+		Returns compiled recipe content, as cached by saveRulesCache().
+		"""
+		return {
+			'sections': self.namespace['sections'], 
+			'rule_index': self.namespace['rule_index'], 
+			'optional_sections': self.optional_sections
+		}
+
+
+	def setCompiledRules(self, compiled):
+		"""
+		Sets compiled recipe content from getCompiledRules().  Nothing is set unless all of it is there.
+		"""
+		(sections, rule_index, optional_sections) = (compiled['sections'], compiled['rule_index'], compiled['optional_sections'])
+		self.namespace['sections'] = sections
+		self.namespace['rule_index'] = rule_index
+		self.optional_sections = optional_sections
+
+		
+	def saveRulesCache(self, cache_path):
+		"""
+		Saves compiled sections and rule index.  Content is written to a temporary file in the cache folder and then renamed into place, so concurrent jobs never see a partially written cache file.
+		"""
+		compiled = self.getCompiledRules()
+		cache_folder = os.path.dirname(cache_path)
+		try:
+			if not os.path.exists(cache_folder):
+				os.makedirs(cache_folder)
+		except OSError: # Another job may have created it in meantime.
+			if not os.path.isdir(cache_folder): raise
+			
+		(temp_handle, temp_path) = tempfile.mkstemp(prefix='.rcqc_recipe_', dir=cache_folder)
+		try:
+			with os.fdopen(temp_handle, 'wb') as cache_handle:
+				pickle.dump(compiled, cache_handle, pickle.HIGHEST_PROTOCOL)
+			os.chmod(temp_path, 0644) # mkstemp() makes file private; cache is shared by jobs.
+			os.rename(temp_path, cache_path)
+			
+		except (IOError, OSError) as e:
+			print "Unable to save compiled recipe %s: %s" % (cache_path, e)
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+
+
+	def compileRules(self):
+		"""
+		Loads recipe file, incorporates custom rules, builds rule index, and converts infix expressions to prefix notation.
+		"""
+		if self.recipe_file_path:
 			with open(self.recipe_file_path,'r') as rules_handle:
 				rulefileobj =  json.load(rules_handle, object_pairs_hook=OrderedDict)
 		else:
@@ -869,10 +1485,13 @@ class RCQCInterpreter(object):
 
 
 	def writeHTMLReport(self, title):
+		"""
+		Writes -H file page in parts, with output folder line ahead of report_html rather than copied into it.
+		"""
 		try:
-			with (open(self.output_html_file, 'w')) as output_handle:
-				self.namespace['report_html'] = "<p>Output folder: %s</p>\n\n%s" % (self.output_folder, self.namespace['report_html'] )
-				output_handle.write(RCQCStaticFnExtension.pageHtml (self.namespace['report_html'], title) )
+			with (open(self.output_html_file, 'w', 1048576)) as output_handle:
+				html_parts = ("<p>Output folder: %s</p>\n\n" % self.output_folder, self.namespace['report_html'])
+				output_handle.writelines(RCQCStaticFnExtension.iterPageHtml (html_parts, title) )
 
 		except IOError as e: 
 			print "IO error(%s): %s when trying to write %s" % (e.errno, e.strerror, self.output_html_file)
@@ -883,14 +1502,15 @@ class RCQCInterpreter(object):
 		"""
 		writeReport(output_json_file=None)
 		Write out report file - i.e. anything within namespace['report']
-		default=lambda: "[nasty iterable]" provides warning string for any objects left in report at this stage.  Shouldn't be any.
+		default=lambda obj: "[nasty iterable]" provides warning string for any objects left in report at this stage.  Shouldn't be any.
 		
 		We don't sort the keys because some dictionaries are ORDERED for display, and others aren't.
+		Report is written piece by piece as it is encoded, rather than being composed as one string first.  --compact drops indentation and spaces.
 		"""
-		report = json.dumps(self.namespace['report'], sort_keys=False, indent=4, separators=(',', ': '), default=lambda: "[nasty iterable]")
+		(indent, separators) = (None, (',', ':')) if self.options.compact_json else (4, (',', ': '))
 		try:
-			with (open(output_json_file,'w') if output_json_file else sys.stdout) as output_handle:
-				output_handle.write(report)
+			with (open(output_json_file,'w', 1048576) if output_json_file else sys.stdout) as output_handle:
+				json.dump(self.namespace['report'], output_handle, sort_keys=False, indent=indent, separators=separators, default=lambda obj: "[nasty iterable]")
 		except OSError as e: 
 			print "OS error(%s): %s when trying to write %s" % (e.errno, e.strerror, self.output_html_file)
 			raise e
@@ -899,16 +1519,31 @@ class RCQCInterpreter(object):
 	def getNamespace(self, myName):
 		"""
 		Search self.namespace for appropriate path, and create it if necessary.  Used by store(...,location), 
+		Resolved paths are cached (see cachedPath()).
 		"""
 		if not isinstance(myName, basestring):
 			raise TypeError ("Problem: getNamespace() given a non-string argument for location:", myName, type(myName) )
 		
+		cached = self.cachedPath('store', myName)
+		if cached is not None:
+			return cached
+
 		# Retrieval of shortcut variable name .z when original name is x.y.z		
 		if myName[0] == '/':
 			print ('ALERT: "%s" not matched to namespace so it is now a string constant.  Perhaps it didn\'t get set?' % myName)
 			return myName
 		
+		(nickname, obj, key) = self.resolveNamespace(myName)
+		self.cachePath('store', myName, nickname, myName.split('/'))
+		return (obj, key)
+
+
+	def resolveNamespace(self, myName):
+		"""
+		getNamespace() path search, without cache.  Returns (nickname path started from or None, dictionary, key).
+		"""
 		focus = self.namespace
+		nickname = None
 		splitName = myName.split('/')
 		ptrNextLast = len(splitName)-1
 		for (ptr, part) in enumerate(splitName):
@@ -922,6 +1557,7 @@ class RCQCInterpreter(object):
 					(parent, returnable) = self.getNickname(part, True)
 					if returnable:
 						focus = parent
+						nickname = part
 			
 			if part in focus:
 			
@@ -931,7 +1567,7 @@ class RCQCInterpreter(object):
 			
 				# At y in ...x/y/z path:
 				if ptr == ptrNextLast:
-					return (focus, part)
+					return (nickname, focus, part)
 				
 				focus = focus[part]
 				continue
@@ -939,7 +1575,7 @@ class RCQCInterpreter(object):
 			# At y in ...x/y/z path:
 			if ptr == ptrNextLast:
 				self.setNickname(focus, part)
-				return (focus, part)
+				return (nickname, focus, part)
 			
 			#Not at last place in path, so create a dictionary item for part
 			focus[part] = OrderedDict() #Its left to other iterators to set up arrays.
@@ -958,12 +1594,20 @@ class RCQCInterpreter(object):
 		Means top level variables superceed any previous nicknames established via leaf store()
 		Abbreviations are checked for top-level match before bottom-level match.
 		If existFlag == True, return whether or not given variable exists.
+		Paths that are found are cached (see cachedPath()).
 		"""
 		if not isinstance(myName, basestring) or len(myName) == 0 or myName[0] == '/' or ' ' in myName:
 			return myName
 				
+		cached = self.cachedPath('read', myName)
+		if cached is not None:
+			if existsFlag: return True
+			return cached[0][cached[1]]
+
 		splitName = myName.split('/')
 		focus = self.namespace	
+		nickname = None
+		keys = []
 
 		#Here we have a path with slashes
 		for (ptr, part) in enumerate(splitName):
@@ -971,19 +1615,23 @@ class RCQCInterpreter(object):
 			if focus != None:
 				if isinstance(focus, dict):
 					if part in focus:
+						keys.append(part)
 						focus = focus[part] # Advance along path
 						continue
 					#If first term is nickname, see if we can pick up path from it
 					if ptr == 0:
-						(reference, returnable) = self.getNickname(part)
+						(reference, returnable) = self.getNickname(part, True)
 						if returnable:
-							focus = reference
+							keys.append(part)
+							nickname = part
+							focus = reference[part]
 							continue
 
 				if isinstance(focus, list):
 					if part.isnumeric():
 						partint = int(part)
 						if partint >= 0 and partint < len(focus):
+							keys.append(partint)
 							focus = focus[partint]
 							continue
 
@@ -993,10 +1641,59 @@ class RCQCInterpreter(object):
 			if existsFlag: return False
 			return myName # Term is a literal 
 
+		self.cachePath('read', myName, nickname, keys)
 		if existsFlag: return True
 		return focus # now a value / object
-	
-	
+
+
+	def cachedPath(self, cache, myName):
+		"""
+		Returns (dictionary or list, key) that myName resolves to for cache 'store' (getNamespace()) or 'read' (namespaceReadValue()), or None if it isn't cached or must be searched for again.
+		A cached path keeps its keys, and whether its first name was a top level name or a nickname.  Its keys are followed again from there, so e.g. a row dictionary that iterate() replaces is picked up without a new search.  A path is searched for again if following it could differ from a full search: a part is missing, its first name changed from top level name to nickname or back, its nickname moved, or (for store) one of its parts still needs a nickname.
+		"""
+		entry = self.path_cache[cache].pop(myName, None)
+		if entry is None:
+			return None
+
+		(nickname, keys) = entry
+		name_index = self.namespace['name_index']
+		if nickname is None:
+			focus = self.namespace
+		elif nickname in self.namespace:
+			focus = None
+		else:
+			focus = name_index.get(nickname, None)
+
+		ptrLast = len(keys) - 1
+		for (ptr, key) in enumerate(keys):
+			if isinstance(focus, dict):
+				# Only a store path's last part can be missing (store adds it).  Full search would give a nickname to a part lacking one, or point a missing last part's nickname here.
+				if key not in focus and (cache == 'read' or ptr == 0 or ptr < ptrLast):
+					break
+				if cache == 'store' and ptr > 0 and not key.isdigit() and not '%(' in key:
+					if (key not in name_index) if key in focus else (name_index.get(key, None) is not focus):
+						break
+			elif not (isinstance(focus, list) and isinstance(key, int) and key < len(focus)):
+				break
+
+			if ptr == ptrLast:
+				self.path_cache[cache][myName] = entry # Now most recently used
+				return (focus, key)
+			focus = focus[key]
+
+		return None
+
+
+	def cachePath(self, cache, myName, nickname, keys):
+		"""
+		Caches path myName as resolved for cachedPath(), dropping least recently used path once PATH_CACHE_SIZE are cached.
+		"""
+		paths = self.path_cache[cache]
+		if len(paths) >= PATH_CACHE_SIZE:
+			paths.popitem(last=False)
+		paths[myName] = (nickname, keys)
+
+
 	def getNickname(self, nickname, parent_flag=False):
 		""" 
 		Whenever the "store(... location)" function is called, a reverse lookup is set up on the leaf c part of the location's a/b/c path to point to the full path.  Thus c can be a nickname to the latest use of the term.  The only issue arises if c is overwritten by other processes that happen to store paths with the same c leaf. In such cases programmers must change rule references to a leaf name, or stick to the full path a/b/c reference for that variable.
@@ -1023,13 +1720,27 @@ class RCQCInterpreter(object):
 		Abbreviated name can't be numeric (an array index), and it can't be a string-replace % variable
 		"""
 		if not nickname.isdigit() and not '%(' in nickname:
-			if DEBUG > 0: print ('Overwriting "%s"' if nickname in self.namespace['name_index'] else 'Setting "%s"') % nickname
-			self.namespace['name_index'][nickname] = parent
+			self.indexNickname(nickname, parent)
+
+
+	def indexNickname(self, nickname, parent):
+		"""
+		Points nickname at parent dictionary.  If nickname was pointing at another dictionary that still has it, this is a collision: count is kept in name_collisions, and shown with DEBUG on, since a recipe referencing the earlier path by nickname now gets the new one.  Cached paths starting from a moved nickname are searched for again (see cachedPath()).
+		"""
+		previous = self.namespace['name_index'].get(nickname, None)
+		if previous is parent:
+			return
+
+		if previous is not None and nickname in previous:
+			collisions = self.namespace['name_collisions'][nickname] = self.namespace['name_collisions'].get(nickname, 0) + 1
+			if DEBUG > 0: print 'Nickname "%s" moved to another path (%s times).  Its earlier path now needs to be referenced in full.' % (nickname, collisions)
+		elif DEBUG > 0: print ('Overwriting "%s"' if previous is not None else 'Setting "%s"') % nickname
+		self.namespace['name_index'][nickname] = parent
 	
 	# Goes through given hierarchy, creating namespace references. 
 	# Note, if a name shows up a few times, only latest will get nickname pointer.
 	def setNicknames(self, term, termdict):
-		self.namespace['name_index'][term] = termdict
+		self.indexNickname(term, termdict)
 		if isinstance(termdict[term], dict):
 			for term2 in termdict[term]:
 				self.setNicknames(term2, termdict[term])
@@ -1039,9 +1750,10 @@ class RCQCInterpreter(object):
 		return os.path.dirname(sys._getframe().f_code.co_filename)
 		
 		
-	def get_command_line(self):
+	def get_command_line(self, args=None):
 		"""
 		*************************** Parse Command Line *****************************
+		Parses given argument list, or sys.argv if none.
 		"""
 		parser = MyParser(
 			description = 'Report Calc for Quality Control (RCQC) is an interpreter for the RCQC scripting language for text-mining log and data files to create reports and to control workflow within a workflow engine. It works as a python command line tool and also as a Galaxy bioinformatics platform tool.  See https://github.com/Public-Health-Bioinformatics/rcqc',
@@ -1080,11 +1792,67 @@ class RCQCInterpreter(object):
 
 		parser.add_option('-s', '--save_rules', type='string', dest='save_rules_path', help='Save modified ruleset to a file.')
 
+		parser.add_option('--compact', action='store_true', dest='compact_json', help='Write JSON report without indentation, for smaller report files.')
+
+		parser.add_option('-b', '--batch', type='string', dest='batch_file_path', help='Run recipe on each sample in this tab-delimited manifest file, one line per sample with columns: input files (as -i), JSON settings (as -j), output report file (as -o), and optionally output HTML file (as -H) and output folder (as -f).  A batch summary is written to -o file, or stdout.')
+
+		parser.add_option('-P', '--processes',type='int', dest='processes', default=0, help='Maximum number of worker processes for parallelIterate() and --batch samples.  Defaults to number of CPUs.')
+
+		parser.add_option('--serve', type='string', dest='serve_socket_path', help='Run as a server on this Unix socket file, keeping compiled recipes in memory and running jobs sent by --server clients (up to -P at a time).')
+
+		parser.add_option('-S', '--server', type='string', dest='server_socket_path', help='Send job to RCQC server running on this Unix socket file, rather than running it here.  Other options are as usual, with files relative to the working folder.')
+
+		parser.add_option('-C', '--cache', type='string', dest='cache_folder', help='Keep compiled recipes in this folder, and reuse them while recipe, custom rules and optional sections are unchanged.')
+
+		parser.add_option('--file_cache', type='int', dest='file_cache_size', help='Keep up to this many megabytes of input file contents in memory, so rules and sections reading a file again don\'t reread it from disk.  Defaults to 64; 0 turns caching off.')
+
+		parser.add_option('--decompress_thread', action='store_true', dest='decompress_thread', help='Decompress gzip, bz2 and xz input files in a background thread while rules read them.  Such files are recognized by content and otherwise read as usual.')
+
+		parser.add_option('--profile', action='store_true', dest='profile', help='Record wall time, function calls, iterated rows and input file bytes read per section and rule in report/job/profile, sorted by cumulative time.')
+
+		parser.add_option('--profile_file', type='string', dest='profile_file_path', help='As --profile, and also write profile to this tab-delimited file.')
+
 		parser.add_option('-D', '--debug', action='store_true', dest='debug', help='Provides more detail about rule execution on stdout.')
 
-		return parser.parse_args()
+		return parser.parse_args(args)
 
 	
+class RCQCServer(SocketServer.ForkingMixIn, SocketServer.UnixStreamServer):
+	"""
+	Unix socket server for rcqc.py --serve .  A job request's recipe is loaded by the server process; the job itself runs in a forked child process.
+	"""
+	def __init__(self, socket_path, interpreter):
+		self.interpreter = interpreter
+		self.max_children = interpreter.options.processes if interpreter.options.processes else multiprocessing.cpu_count()
+		self.load_reply = None
+		SocketServer.UnixStreamServer.__init__(self, socket_path, RCQCServerHandler)
+
+	def process_request(self, request, client_address):
+		# Job is loaded, and its child forked, in client's working folder.  Server goes back to its own afterwards, so the next client's relative paths don't depend on this one.
+		server_cwd = os.getcwd()
+		try:
+			self.load_reply = self.interpreter.captureServerJob(self.interpreter.loadServerJob, request.makefile('rb').readline())
+			SocketServer.ForkingMixIn.process_request(self, request, client_address)
+		finally:
+			os.chdir(server_cwd)
+
+
+class RCQCServerHandler(SocketServer.StreamRequestHandler):
+	"""
+	Runs a job in server's child process, and writes reply back to client as JSON: exit code, stdout and stderr text, and report.
+	"""
+	def handle(self):
+		reply = self.server.load_reply
+		if reply['exit_code'] is None:
+			job_reply = self.server.interpreter.captureServerJob(self.server.interpreter.runServerJob)
+			job_reply['stdout'] = reply['stdout'] + job_reply['stdout']
+			job_reply['stderr'] = reply['stderr'] + job_reply['stderr']
+			job_reply['report'] = self.server.interpreter.namespace['report']
+			reply = job_reply
+
+		self.wfile.write(json.dumps(reply, sort_keys=False, default=lambda obj: "[nasty iterable]") + '\n')
+
+
 if __name__ == '__main__':
 
 	rcqc = RCQCInterpreter()
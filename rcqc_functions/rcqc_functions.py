@@ -1,14 +1,26 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 import sys
+import bisect
 import fnmatch
+import mmap
+import multiprocessing
 import re
 import os.path
 import datetime
 import collections
+import itertools
+import contextlib
+import copy
+import cStringIO
+import StringIO
 import dateutil.parser as dateparser
 import math
 import operator
+import zlib
+import bz2
+import threading
+import Queue
 
 try: #Python 2.7
 	from collections import OrderedDict
@@ -20,11 +32,268 @@ try:
 except ImportError: # Python 2.6
     	import json
     	
+try:
+	import lzma
+except ImportError: # Python 2, unless backports.lzma package is installed
+	try:
+		from backports import lzma
+	except ImportError:
+		lzma = None
+
 DEBUG = 0
 
+# Compiled regular expressions by pattern text for getRegExp(), least recently used first.  Python's own re module cache is small and is cleared whenever it fills up.
+REGEXP_CACHE = OrderedDict()
+REGEXP_CACHE_SIZE = 256
+REGEXP_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+# Converters for regular expression named groups declared with a type suffix, e.g. (?P<value__int>...).  A value that doesn't convert is parsed by parseDataType() instead.
+REGEXP_GROUP_TYPES = {
+	'int': int,
+	'float': float,
+	'bool': lambda text: {'true': True, 'false': False}[text.lower()],
+	'str': lambda text: text
+}
+
+# Input file contents by (path, size, modification time), least recently used first, so rules and sections reading a file again don't reread it from disk.  FILE_CACHE_SIZE is default total size in bytes (see --file_cache).
+FILE_CACHE = OrderedDict()
+FILE_CACHE_SIZE = 64 * 1048576
+FILE_CACHE_STATS = {'hits': 0, 'misses': 0, 'bytes_saved': 0, 'bytes': 0}
+# Keys of files streamed once, which are cached if they are read again; up to FILE_CACHE_SEEN_SIZE of them, least recently read first.
+FILE_CACHE_SEEN = OrderedDict()
+FILE_CACHE_SEEN_SIZE = 1024
+
+# Leading "magic" bytes of compressed input files, which file readers decompress as they go (see CompressedFile).  Files are read through an INPUT_BUFFER_SIZE buffer, and gzip content is decompressed up to INPUT_BUFFER_SIZE bytes at a time.  Python 2's bz2 and lzma can't limit their output, so they are given at most DECOMPRESS_INPUT_SIZE bytes of compressed input at a time instead, less if it is decompressing to more than INPUT_BUFFER_SIZE bytes.  A --decompress_thread background thread keeps up to DECOMPRESS_QUEUE_SIZE decompressed chunks ready.
+COMPRESSION_MAGIC = [('\x1f\x8b', 'gzip'), ('BZh', 'bz2'), ('\xfd7zXZ\x00', 'xz')]
+INPUT_BUFFER_SIZE = 4 * 1048576
+DECOMPRESS_INPUT_SIZE = 65536
+DECOMPRESS_QUEUE_SIZE = 4
+
+# Number of lines parseFixedWidth() reads to find column boundaries, and its pattern for runs of non-space text.
+FIXED_WIDTH_SAMPLE_LINES = 1000
+FIXED_WIDTH_TEXT = re.compile('[^ ]+')
+
+# Number of data rows importColumns() samples to pick each column's data type.
+TABULAR_SAMPLE_ROWS = 100
+
 def stop_err( msg, exit_code=1 ):
 	sys.stderr.write("%s\n" % msg)
 	sys.exit(exit_code)
+
+
+def sniffCompression(data):
+	"""
+	Returns 'gzip', 'bz2' or 'xz' if data starts with that format's magic bytes, otherwise None.
+	"""
+	for (magic, compression) in COMPRESSION_MAGIC:
+		if data.startswith(magic):
+			return compression
+	return None
+
+
+def getCompression(path):
+	"""
+	Returns compression format of file at path, going by its first few bytes rather than its name, or None if it isn't compressed.
+	"""
+	with open(path, 'rb') as file_handle:
+		return sniffCompression(file_handle.read(6))
+
+
+class CompressedFile(object):
+	"""
+	Read-only file object that decompresses a gzip, bz2 or xz file while it is read.  Concatenated streams (e.g. bgzip output) are read one after another.
+	With threaded=True, a background thread decompresses ahead of the reader.  zlib, bz2 and lzma release the GIL while decompressing, so this overlaps with rules working on lines already read.
+	Supports line iteration, read() and close() - all that RCQC file readers use.
+	"""
+	def __init__(self, path, compression, threaded=False):
+		if compression == 'xz' and lzma is None:
+			raise IOError('Reading xz file %s requires the lzma module (Python 3.3+, or backports.lzma package)' % path)
+
+		self.name = path
+		self.compression = compression
+		self.file_handle = open(path, 'rb', INPUT_BUFFER_SIZE)
+		self.stopped = threading.Event()
+		if threaded:
+			queue = Queue.Queue(DECOMPRESS_QUEUE_SIZE)
+			thread = threading.Thread(target=self.__decompressInto__, args=(queue,))
+			thread.daemon = True
+			thread.start()
+			self.chunks = self.__queuedChunks__(queue)
+		else:
+			self.chunks = self.__chunks__()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __iter__(self):
+		# Text after a chunk's last newline is held until rest of its line arrives.
+		pending = []
+		for chunk in self.chunks:
+			end = chunk.rfind('\n') + 1
+			if end == 0:
+				pending.append(chunk)
+				continue
+			pending.append(chunk[0:end])
+			for line in cStringIO.StringIO(''.join(pending)):
+				yield line
+			pending = [chunk[end:]]
+
+		line = ''.join(pending)
+		if line:
+			yield line
+
+	def read(self):
+		return ''.join(self.chunks)
+
+	def close(self):
+		self.stopped.set()
+		self.file_handle.close()
+
+	def __decompressor__(self):
+		if self.compression == 'gzip':
+			return zlib.decompressobj(16 + zlib.MAX_WBITS) # 16: expect gzip header and trailer
+		if self.compression == 'bz2':
+			return bz2.BZ2Decompressor()
+		return lzma.LZMADecompressor()
+
+	def __chunks__(self):
+		"""
+		Generator of decompressed content.  A gzip chunk is at most INPUT_BUFFER_SIZE bytes.  A bz2 or xz chunk is whatever its input decompresses to, so input size follows compression ratio so far, aiming for INPUT_BUFFER_SIZE byte chunks.  A single bz2 block or xz chunk of extremely compressible content can still come out larger.
+		"""
+		is_gzip = self.compression == 'gzip'
+		read_size = INPUT_BUFFER_SIZE if is_gzip else 1024 # Until ratio is known.
+		decompressor = self.__decompressor__()
+		data = ''
+		full = False # zlib may hold more output for input it has taken.
+		while True:
+			if not data and not full:
+				data = self.file_handle.read(read_size)
+				if not data:
+					break
+
+			try:
+				if is_gzip:
+					chunk = decompressor.decompress(data, INPUT_BUFFER_SIZE)
+					(data, full) = (decompressor.unconsumed_tail, len(chunk) == INPUT_BUFFER_SIZE)
+				else:
+					chunk = decompressor.decompress(data)
+					read_size = max(64, min(DECOMPRESS_INPUT_SIZE, len(data) * INPUT_BUFFER_SIZE // max(len(chunk), 1)))
+					data = ''
+			except EOFError: # bz2 or xz stream ended exactly at end of previous input, so it had no unused_data; data follows it.
+				decompressor = None
+			else:
+				if chunk:
+					yield chunk
+				if decompressor.unused_data: # End of stream, followed by data.
+					(data, decompressor) = (decompressor.unused_data, None)
+
+			if decompressor is None:
+				# Another stream may follow; anything else (e.g. zero padding) is ignored.
+				if len(data) < 6:
+					data += self.file_handle.read(read_size)
+				if sniffCompression(data) != self.compression:
+					break
+				decompressor = self.__decompressor__()
+
+
+	def __decompressInto__(self, queue):
+		"""
+		Background thread: puts decompressed chunks on queue, followed by None, or by the exception that stopped decompression.
+		"""
+		try:
+			for chunk in self.__chunks__():
+				if not self.__put__(queue, chunk):
+					return
+			item = None
+		except Exception as e:
+			if self.stopped.is_set(): # File was closed before being read to end.
+				return
+			item = e
+		self.__put__(queue, item)
+
+	def __put__(self, queue, item):
+		# Waits for room on queue, giving up if file is closed meanwhile.
+		while not self.stopped.is_set():
+			try:
+				queue.put(item, True, 0.1)
+				return True
+			except Queue.Full:
+				pass
+		return False
+
+	def __queuedChunks__(self, queue):
+		while True:
+			chunk = queue.get()
+			if chunk is None:
+				break
+			if isinstance(chunk, Exception):
+				raise chunk
+			yield chunk
+
+# (RCQCClassFnExtension instance, iterator items, location, functions) shared with parallelIterate() worker processes when they are forked.
+PARALLEL_ITERATE = None
+
+def parallelIterateWorker(ptr):
+	"""
+	Runs one parallelIterate() iteration in a worker process, returning changes it made to report/ namespace.
+	"""
+	(fnExtension, items, location, functions) = PARALLEL_ITERATE
+	report = fnExtension.callerInstance.namespace['report']
+	before = copy.deepcopy(report)
+	fnExtension.callerInstance.appended_lists = set()
+	try:
+		fnExtension.iterate([items[ptr]], location, *functions)
+	except SystemExit as e: # Would otherwise take down pool's worker process without a result.
+		raise RuntimeError ('parallelIterate() iteration #%s exited with code %s' % (ptr, e.code))
+
+	return getReportChanges(before, report, fnExtension.callerInstance.appended_lists)
+
+def getReportChanges(before, after, appended=()):
+	"""
+	Returns list of (key, action, value) changes that turn dictionary "before" into "after".  Action is 'new' for a new key, 'set' for a replaced value, 'extend' for items added to end of a list, and 'merge' for a new or changed dictionary having its own list of changes.  Removed keys aren't recorded.
+	Only lists that append() or messageAppend() added to are extended; any other list is set, as a later iterate() iteration storing it would replace it.  appended holds (id(dictionary), key) of these lists, or just the id of a list node, which is only extended under a key that already held its earlier items.  So a key merely referring to an appended list is set too.
+	"""
+	changes = []
+	for (key, value) in after.iteritems():
+		if not key in before:
+			if isinstance(value, dict): # Merged into a dictionary that earlier changes may have created.
+				changes.append( (key, 'merge', getReportChanges({}, value, appended)) )
+			elif isinstance(value, list) and (id(after), key) in appended:
+				changes.append( (key, 'extend', value) )
+			else:
+				changes.append( (key, 'new', value) )
+			continue
+		old_value = before[key]
+		if old_value == value:
+			continue
+		if isinstance(old_value, dict) and isinstance(value, dict):
+			changes.append( (key, 'merge', getReportChanges(old_value, value, appended)) )
+		elif isinstance(old_value, list) and isinstance(value, list) and ((id(after), key) in appended or id(value) in appended) and value[0:len(old_value)] == old_value:
+			changes.append( (key, 'extend', value[len(old_value):]) )
+		else:
+			changes.append( (key, 'set', value) )
+
+	return changes
+
+def applyReportChanges(callerInstance, target, changes):
+	"""
+	Applies changes from getReportChanges() to target dictionary.  Nicknames are set for new keys as store() would.
+	A dictionary or appended list that an earlier set of changes has already created (e.g. report/quality_control/message) is combined with it.
+	"""
+	for (key, action, value) in changes:
+		existing = target.get(key, None)
+		if action == 'merge' and isinstance(existing, dict):
+			applyReportChanges(callerInstance, existing, value)
+		elif action == 'extend' and isinstance(existing, list):
+			existing.extend(value)
+		else:
+			target[key] = value if action != 'merge' else applyReportChanges(callerInstance, OrderedDict(), value)
+			callerInstance.setNicknames(key, target)
+
+	return target
 	
 """
 	The functions below primarily exist for use in user's rulesets, but a few are also used directly in report_calc.py engine.
@@ -72,6 +341,14 @@ class RCQCStaticFnExtension(object):
 		getHtml(location, title, depth=0) -- Returns object at location as HTML string.  Indented starting with tabs of given depth
 		In this case "content" is not iterable (not a function having yeild).
 		"""
+		return ''.join(RCQCStaticFnExtension.iterHtml(content, title, depth))
+
+
+	@staticmethod	
+	def iterHtml(content, title='', depth=0): 
+		"""
+		iterHtml(location, title, depth=0) -- As getHtml(), but yields HTML in parts (e.g. table rows) rather than composing one string.  writeFile() and iterPageHtml() write these parts as they come.
+		"""
 		formating = {
 			'tabs': '	' * depth, #Json encoded
 			'title': title,
@@ -82,46 +359,54 @@ class RCQCStaticFnExtension(object):
 			}
 
 		if isinstance(content, (dict,list)):
+			keys = None
 			# Sorting keys so that tables (iterable within an iterable)
 			if  isinstance(content, dict): 
 				#Sorts dictionary keys alphabetically but with non-atomic (object) items last in list.
 				content_iterable = 	iter(sorted(content.items(), key=lambda (mykey, myvalue): hasattr(myvalue, '__iter__') )) 
-				formating['content'] = '\n'.join([RCQCStaticFnExtension.getHtml(value, key, depth+1) for (key, value) in content_iterable])
 					
 			else: # list here.
 				# If every item has the same dictionary keys then show it as a table.
 				if RCQCStaticFnExtension.__isTable__(content):
 					keys = content[0].keys()
 					formating['trHead'] = '<tr><td>' +'</td><td>'.join( keys ) + '</td></tr>\n'
-					formating['content'] = ''
-					for (ptr, myDict) in enumerate(content):
-						cells = ''
-						for key in keys:
-							value = myDict[key]
-							numeric = '' if isinstance(value, basestring) else  ' class="numeric"' 
-							cells += '<td%s>%s</td>' % (numeric, value)
-						formating['content'] += '<tr>' + cells + '</tr>\n'
 
 				else: # Show as a mish-mash
 					content_iterable = enumerate(content)
-					formating['content'] = '\n'.join([RCQCStaticFnExtension.getHtml(value, key, depth+1) for (key, value) in content_iterable])
 			
 			if depth > 0: # Inside a table here
 				formating['trPrefix'] = '<tr><td colspan="2">'
 				formating['trSuffix'] = '</td></tr>'
 				
-			return """
+			yield """
 %(tabs)s%(trPrefix)s<table class="RCQC depth_%(depth)s">
 %(tabs)s	<caption>%(title)s</caption>
 %(tabs)s	<thead>%(trHead)s</thead>
-%(tabs)s	<tbody>%(content)s</tbody>
+%(tabs)s	<tbody>"""  % formating
+
+			if keys is not None:
+				for myDict in content:
+					cells = []
+					for key in keys:
+						value = myDict[key]
+						numeric = '' if isinstance(value, basestring) else  ' class="numeric"' 
+						cells.append('<td%s>%s</td>' % (numeric, value))
+					yield '<tr>' + ''.join(cells) + '</tr>\n'
+			else:
+				for (ptr, (key, value)) in enumerate(content_iterable):
+					if ptr > 0: 
+						yield '\n'
+					for fragment in RCQCStaticFnExtension.iterHtml(value, key, depth+1):
+						yield fragment
+
+			yield """</tbody>
 %(tabs)s	<tfoot></tfoot>
 %(tabs)s</table>%(trSuffix)s\n"""  % formating
 		
 		else:
 			formating['content'] = content
 			formating['numeric'] = '' if isinstance(content, basestring) else  ' class="numeric"' 
-			return '<tr><td>%(title)s</td%(numeric)s><td>%(content)s</td></tr>' % formating
+			yield '<tr><td>%(title)s</td%(numeric)s><td>%(content)s</td></tr>' % formating
 		
 		
 	@staticmethod
@@ -129,18 +414,58 @@ class RCQCStaticFnExtension(object):
 		"""
 		isTable(content) -- Checks to see if each item in content array is a dictionary with the same keys 
 		"""
-		if len(content) == 0: 
+		if len(content) == 0 or not isinstance(content[0], dict): 
 			return False
-		for (ptr,item) in enumerate(content):
-			if not isinstance(item, dict):	return False
-			if ptr == 0:
-				dictKeySet = set(item.keys() )
-			else:
-				# If one or other has a different key, we don't have a table
-				if len(dictKeySet ^ set(item.keys()) ) > 0: return False
+		dictKeys = content[0].viewkeys()
+		for item in content:
+			# If one or other has a different key, we don't have a table
+			if not isinstance(item, dict) or item.viewkeys() != dictKeys: return False
 		return True
 					
 					
+	@staticmethod
+	def __tallyBases__(counts, sequence):
+		"""
+		Adds count of each character in sequence text to counts, an OrderedDict, keeping characters in order first seen as iStatBP() does.  Counting is done per distinct character via str.count() rather than character by character.  Case is merged later by __baseStats__().
+		"""
+		chars = set(sequence)
+		for char in sorted((char for char in chars if char not in counts), key=sequence.find):
+			counts[char] = 0
+		for char in chars:
+			counts[char] += sequence.count(char)
+		return counts
+
+
+	@staticmethod
+	def __baseStats__(counts, location=None):
+		"""
+		Adds counts from __tallyBases__() to iStatBP() style statistics in location dictionary (a new one if none given): G, C, A, T, total, any other characters (e.g. N), and G%, C%, A%, T%, GC_content% .
+		"""
+		if location is None:
+			location = OrderedDict()
+
+		buckets = ['G','C','A','T']
+		total = sum(counts.itervalues())
+		if total == 0:
+			return location
+
+		if not 'A' in location: #indicates it hasn't been initialized.
+			for item in buckets:
+				location[item] = 0
+			location['total'] = 0
+
+		location['total'] += total
+		for char in counts:
+			char_upper = char.upper()
+			location[char_upper] = location.get(char_upper, 0) + counts[char]
+
+		for item in buckets:
+			location[item + '%'] = int(round(100*operator.truediv(location[item], location['total'] ) ))
+
+		location['GC_content%'] = int(round(100*operator.truediv(location['G'] + location['C'], location['total'] )) )
+		return location
+
+
 	@staticmethod	
 	def first(location): 
 		"""
@@ -268,61 +593,50 @@ class RCQCStaticFnExtension(object):
 			
 		
 	@staticmethod
-	def parseFixedWidth(myText):
+	def parseFixedWidth(myText, sample_lines=None):
 		"""
-		parseFixedWidth(text) -- Convert a text file with fixed-width columnar data into tabular text, so it can be processed by getTabular()
+		parseFixedWidth(text, sample_lines=None) -- Iterator that converts text with fixed-width columnar data into {'value': tab-delimited line} rows, so it can be stored, or processed by importTabular() or getTabular().  Text can also be an iterable of lines, e.g. from readFileByName().
 		- Assumes any lines that have no spaces in them can be skipped.
 		- Also assumes that header labels are sparated by at least two spaces.
+		- Column boundaries are found from the first sample_lines lines (default FIXED_WIDTH_SAMPLE_LINES); later lines are converted as they are read.
 		# FUTURE: Allow for skipping lines by comment character
-		# Issue, can't iterate this in one pass because need to identify columns first.
-		"""
-		spaces = []
-		output = []
-		header = None
-		linecount = 0
-		maxlen = 0
-		for line in myText.split('\n'):
-			if line.strip().find(' ') >= 0: #If line has at least one meaningful space delimiter
-				linecount += 1
-				if len(line) > maxlen: 
-					maxlen = len(line)
-
-				if linecount < 3:	
-					if linecount ==1:
-						header = line
-					if linecount == 2: # past header, and into real data. #get real data/header line length here:
-						spaces = [column for column, char in enumerate(line) if char == ' ']
-					continue
-				
-				for column in reversed(spaces):
-					if line[column] != ' ': spaces.remove(column) 
-
-		# Consolidate consecutive space columns into first one.
-		for column in reversed(spaces):
-			if column - 1 in spaces:
-				spaces.remove(column)
-		
-		for ptr, column in enumerate(spaces):
-			column1 = header.find('  ',column)
-			if column1 > -1:
-				spaces[ptr] = column1
-		
-		# Ensure 1st column is 0 (data could start immediately)
-		if spaces[0] != 0: spaces.insert(0,0)
-		# Ensure last column is end of line column
-		if not maxlen-1 in spaces: spaces += [maxlen-1]
-		
-		# Spaces[] now has column boundaries.
-		for line in myText.split('\n'):
-			if line.strip().find(' ') >= 0: # skip cosmetic lines again.
-				lineout = []
-				for ptr,column in enumerate(spaces[1 : ]):
-					lineout.append(line[spaces[ptr] : column].strip() )
-	
-				output += ['\t'.join(lineout)]
-		
-		return output
-				
+		"""
+		if isinstance(myText, basestring):
+			myText = StringIO.StringIO(myText)
+		if sample_lines is None:
+			sample_lines = FIXED_WIDTH_SAMPLE_LINES
+
+		lines = (line['value'] if isinstance(line, dict) else line for line in myText)
+		lines = (line.rstrip('\r\n') for line in lines)
+		lines = (line for line in lines if line.strip().find(' ') >= 0) # If line has at least one meaningful space delimiter
+		sample = list(itertools.islice(lines, sample_lines))
+		if not sample:
+			return
+
+		# Bitmap of columns that are a space in every data line (past header), within first data line's width.  A shorter data line doesn't clear columns past its end.
+		header = sample[0]
+		width = max(len(line) for line in sample)
+		spaces = bytearray(width)
+		if len(sample) > 1:
+			spaces[0 : len(sample[1])] = bytearray('\x01' * len(sample[1]))
+			for line in sample[1:]:
+				for match in FIXED_WIDTH_TEXT.finditer(line):
+					spaces[match.start() : match.end()] = bytearray(match.end() - match.start())
+
+		# Consecutive space columns start at first one, then move to header's next label gap.
+		boundaries = []
+		for column in xrange(width):
+			if spaces[column] and (column == 0 or not spaces[column-1]):
+				column1 = header.find('  ', column)
+				boundaries.append(column1 if column1 > -1 else column)
+
+		# Ensure 1st column is 0 (data could start immediately), and last column runs to end of line.
+		if not boundaries or boundaries[0] != 0: boundaries.insert(0, 0)
+		columns = zip(boundaries, boundaries[1:] + [None])
+
+		for line in itertools.chain(sample, lines):
+			yield {'value': '\t'.join([line[start : end].strip() for (start, end) in columns])}
+
 		
 	@staticmethod
 	def parseDate(adate):
@@ -393,6 +707,49 @@ class RCQCStaticFnExtension(object):
 	 	return data
 
 	
+	@staticmethod
+	def statisticNMulti(numlist, splits=(50, 75, 90, 99), genome_length=0):
+		"""
+		statisticNMulti(numeric_array, splits=[50, 75, 90, 99], genome_length=None) -- N, L (and NG, LG if genome_length given) statistics for each of the given splits, from one sort of the passed array of contig lengths.
+		
+		Uses same N definition as statisticN(), but contig_Lxx is position of contig_Nxx contig, and contig_LGxx is position of contig_NGxx contig (in descending length order, starting from 0).  Splits can be a list or a comma-delimited string of numbers.
+		Once contig lengths are sorted, a cumulative sum array is built, and each threshold is found in it by binary search.
+		"""
+		if isinstance(splits, basestring):
+			splits = [RCQCStaticFnExtension.parseDataType(split.strip()) for split in splits.split(',')]
+		elif not hasattr(splits, '__iter__'):
+			splits = [splits]
+			
+		try:
+			sorted_contigs = sorted(numlist, reverse=True)
+		except: 
+			raise AttributeError ("statisticNMulti() didn't get a list of numbers to work on! ")
+		if len(sorted_contigs) == 0:
+			raise ValueError ("statisticNMulti() was given an empty list of contig lengths.")
+			
+		cumulative = []
+		total = 0
+		for contig_length in sorted_contigs:
+			total += contig_length
+			cumulative.append(total)
+		
+		assembly_length = math.fsum(sorted_contigs)
+		last = len(sorted_contigs) - 1
+		
+		data = OrderedDict()
+		for split in splits:
+			ptr = min(bisect.bisect_left(cumulative, assembly_length*split/100), last)
+			data[ 'contig_N' + str(split)] = sorted_contigs[ptr]
+			if genome_length > 0:
+				ptrG = min(bisect.bisect_left(cumulative, genome_length*split/100), last)
+				data[ 'contig_NG' + str(split)] = sorted_contigs[ptrG]
+			data[ 'contig_L' + str(split)] = ptr
+			if genome_length > 0:
+				data[ 'contig_LG' + str(split)] = ptrG
+				
+		return data
+
+	
 	@staticmethod
 	def parseInt(value):
 		"""
@@ -413,7 +770,15 @@ class RCQCStaticFnExtension(object):
 		"""
 		pageHtml(html_content, title) -- Wraps html_content with barebones html5 doctype etc. tags. 
 		"""
-		return """<!doctype html>
+		return ''.join(RCQCStaticFnExtension.iterPageHtml(html_content, title))
+
+
+	@staticmethod
+	def iterPageHtml(html_content, title="Data"):
+		"""
+		iterPageHtml(html_content, title) -- As pageHtml(), but yields page in parts for writeFile() to write as they come.  html_content can be text, or parts of it as from iterHtml().
+		"""
+		(head, tail) = """<!doctype html>
 <html lang="en">
 	<head>
 		<meta charset="utf-8">
@@ -454,7 +819,15 @@ class RCQCStaticFnExtension(object):
 	<body>
 	%s
 	</body>
-</html>""" % (title, html_content)
+</html>""".rsplit('%s', 1)
+
+		yield head % title
+		if isinstance(html_content, basestring):
+			yield html_content
+		else:
+			for fragment in html_content:
+				yield fragment
+		yield tail
 
 ################################### ITERABLES ###################################
 		
@@ -473,74 +846,129 @@ class RCQCStaticFnExtension(object):
 	def regexp(subjects, regex, clean_name=False):
 		"""
 		regexp(text regular_expression, clean_name=False) -- Apply python regular expression to text.  Use named groups (?P<value>...) to return result dictionary.  For optional (?P<name>...), clean_name=True on "A BC" yeilds "a_bc"; clean_name=camelCase yeilds "aBc".
+		Text can also be a memory mapped file from mmapFileByName(), or a buffer from sections().  Regular expression can be text or from getRegExp().
+		A group's type can be declared by a __int, __float, __bool or __str suffix, e.g. (?P<value__int>\d+) gives "value" converted straight to integer.  Otherwise "value" data type is recognized by parseDataType() and other groups stay text.
 		
 		ROW is integer index of current match row 
 		"""
 		if not hasattr(subjects, '__iter__'):
 			subjects = [subjects]
 		
+		try:
+			regex = RCQCStaticFnExtension.getRegExp(regex)
+		except (TypeError, re.error):
+		 	raise TypeError ("regexp() couldn't compile the regular expression.")
+
+		groupTypes = RCQCStaticFnExtension.__regExpGroupTypes__(regex)
+		parseValue = not 'value' in [name for (group, name, converter) in groupTypes]
+
 		for subject in subjects:
 			if isinstance(subject, dict) and 'value' in subject:
 				subject = subject['value']
-			if not isinstance(subject, basestring):
+			if not isinstance(subject, (basestring, mmap.mmap, bytearray, buffer)):
 			 	raise ValueError ( "regexp() didn't receive a string to search.")
-			try:
-				regexResult = re.finditer(regex, subject)
-			except TypeError:
-			 	raise TypeError ("regexp() couldn't compile the regular expression.")
+			regexResult = regex.finditer(subject)
 		 	
-		 	if DEBUG > 0: print 'Applying re "%s" to "%s ..."' % (regex, subject[0:50].replace('\n' , '\\n'))
+		 	if DEBUG > 0: print 'Applying re "%s" to "%s ..."' % (regex.pattern, subject[0:50].replace('\n' , '\\n'))
 		 	
 		 	# To modify contents of an iterator as it is delivered, must deliver modification using "yeild"
 			for ptr, myNextItem in enumerate(regexResult):
 				
 				myDict = myNextItem.groupdict()
+				if groupTypes:
+					RCQCStaticFnExtension.__typeGroups__(myDict, groupTypes)
 				myDict['ROW'] = ptr
 				if clean_name != False and 'name' in myDict:
 					myDict['name'] =  RCQCStaticFnExtension.nameCamelCase(myDict['name']) if clean_name == 'camelCase' else RCQCStaticFnExtension.nameUnderScore(myDict['name'])
 				if 'value' in myDict:
-					myDict['value'] = RCQCStaticFnExtension.parseDataType(myDict['value'])
+					if parseValue:
+						myDict['value'] = RCQCStaticFnExtension.parseDataType(myDict['value'])
 				else:
 					myDict['value'] = ''
 					
 				yield myDict
 	
 	
+	@staticmethod
+	def __regExpGroupTypes__(regex):
+		"""
+		Returns list of (group, name, converter) for compiled regular expression's named groups that have a REGEXP_GROUP_TYPES suffix, e.g. group "value__int" is name "value" with int converter.
+		"""
+		groupTypes = []
+		for group in regex.groupindex:
+			(name, separator, type_name) = group.rpartition('__')
+			if name and type_name in REGEXP_GROUP_TYPES:
+				groupTypes.append( (group, name, REGEXP_GROUP_TYPES[type_name]) )
+		return groupTypes
+
+
+	@staticmethod
+	def __typeGroups__(myDict, groupTypes):
+		"""
+		Replaces each typed group in regular expression match dictionary with its converted value under its plain name.  A group that didn't match stays None.
+		"""
+		for (group, name, converter) in groupTypes:
+			text = myDict.pop(group)
+			if text is not None:
+				try:
+					text = converter(text)
+				except (ValueError, KeyError): # e.g. "1,037" as int
+					text = RCQCStaticFnExtension.parseDataType(text)
+			myDict[name] = text
+		return myDict
+
+
 	@staticmethod	
 	def getRegExp(string): 
 		"""
-		getRegExp(string) -- Returns compiled regular expression.
+		getRegExp(string) -- Returns compiled regular expression.  The last REGEXP_CACHE_SIZE expressions compiled are kept, so a pattern is compiled only once however often a recipe uses it.  An already compiled expression is returned as is.
 		"""
-		return re.compile(string)
+		if not isinstance(string, basestring):
+			return re.compile(string) # Compiled expression returned as is; otherwise TypeError.
+
+		if string in REGEXP_CACHE:
+			REGEXP_CACHE_STATS['hits'] += 1
+			regex = REGEXP_CACHE.pop(string)
+		else:
+			REGEXP_CACHE_STATS['misses'] += 1
+			regex = re.compile(string)
+			if len(REGEXP_CACHE) >= REGEXP_CACHE_SIZE:
+				REGEXP_CACHE.popitem(last=False)
+
+		REGEXP_CACHE[string] = regex # Now most recently used
+		return regex
 	
 	
 	@staticmethod	
 	def getTabular(content, column='data'): 
 		"""
-		getTabular(content, column='data') -- Converts content to tabular text data with headers.  If content is a dictionary, key / value rows are written; If content is an array of dictionary, inserts header having dictionary keys.  Otherwise one can supply getTabular with column header text.
+		getTabular(content, column='data') -- Converts content to tabular text data with headers, yielding {'value': text} rows for writeFile(), or for store and iterate rules.  If content is a dictionary, key / value lines are returned in one row (iterTabular() streams a large dictionary instead); If content is an array of dictionary, inserts header having dictionary keys, then yields one row per line.  Otherwise one can supply getTabular with column header text.
+		Array of dictionary rows are written in column order of first dictionary.
 		NOTE: no finer control exists over column header or row sorting
 		"""
 		
 		if hasattr(content, '__iter__'):
-			gotHeader = False
+			keys = None # Header columns, once written.
 			if isinstance(content, dict):
 				yield {'value': '\n'.join([key + '\t' + str(val) for (key, val) in content.iteritems()] ) }
 
 			else: #each item is an atomic value (or perhaps a list?)
 				for item in content:
+					if isinstance(item, dict) and item.keys() == ['value']: # e.g. parseFixedWidth() line
+						item = item['value']
 					# An iterable of dictionaries is presented as tabular data with dictionary keys in first row.
 					if isinstance(item, dict):
 					
-						if not gotHeader:
-							gotHeader = True
-							yield {'value':  '\t'.join(item.keys)+'\n'}
-						yield  {'value':  '\t'.join([str(value) for (key,value) in item.iteritems()])+'\n' }
+						if keys is None:
+							keys = item.keys()
+							yield {'value': '\t'.join(map(str, keys)) + '\n'}
+						yield {'value': '\t'.join([str(item.get(key, '')) for key in keys]) + '\n'}
 
 					else:
-						if not gotHeader:
-							gotHeader = True
-							yield  {'value': column+'\n' } #name of array gets put into column header. 
-						yield  {'value': str(item)+'\n' }
+						if keys is None:
+							keys = [column]
+							yield {'value': column+'\n'} #name of array gets put into column header. 
+						yield {'value': str(item)+'\n'}
 
 	
 	@staticmethod	
@@ -557,7 +985,7 @@ class RCQCStaticFnExtension(object):
 			tableHeader = [] 
 		else: 
 		 	gotHeader = True
-		print "importTabular", gotHeader, skip_rows, tableHeader
+		if DEBUG > 0: print "importTabular", gotHeader, skip_rows, tableHeader
 		
 		if isinstance(content, basestring):
 			content = content.split('\n')
@@ -570,22 +998,13 @@ class RCQCStaticFnExtension(object):
 		for row, line in enumerate(content):
 
 			if row >= skip_rows:
-				# Assuming each item of content is a line of text
+				# Assuming each item of content is a line of text, or a {'value': line} row e.g. from parseFixedWidth()
+				if isinstance(line, dict):
+					line = line.get('value', None)
 				if isinstance(line, basestring) and len(line) > 0:
 					if not gotHeader:
 						gotHeader = True
-						ptr = 0
-						for item in line.strip().split('\t'):
-							default = "col"+str(ptr)
-							ptr += 1
-							if clean_name == False:
-								tableHeader.append(item)
-							elif clean_name == 'camelCase':
-								tableHeader.append( RCQCStaticFnExtension.nameCamelCase(item, default) )
-							else:
-								tableHeader.append( RCQCStaticFnExtension.nameUnderScore(item, default) )
-					
-							if DEBUG > 0: 	print "Found column: ", tableHeader[-1]
+						tableHeader.extend(RCQCStaticFnExtension.__tableHeader__(line, clean_name))
 					
 					else:
 						myDict = OrderedDict()
@@ -596,29 +1015,166 @@ class RCQCStaticFnExtension(object):
 						yield myDict
 
 
+	@staticmethod
+	def __tableHeader__(line, clean_name=False):
+		"""
+		Returns list of column names in tab-delimited header line, cleaned up as per importTabular() clean_name.
+		"""
+		tableHeader = []
+		for (ptr, item) in enumerate(line.strip().split('\t')):
+			default = "col"+str(ptr)
+			if clean_name == False:
+				tableHeader.append(item)
+			elif clean_name == 'camelCase':
+				tableHeader.append( RCQCStaticFnExtension.nameCamelCase(item, default) )
+			else:
+				tableHeader.append( RCQCStaticFnExtension.nameUnderScore(item, default) )
+
+			if DEBUG > 0: 	print "Found column: ", tableHeader[-1]
+
+		return tableHeader
+
+
+	@staticmethod
+	def __columnType__(values):
+		"""
+		Returns function that converts text of a column to the data type parseDataType() would give all of given sample values: int, float, bool, or text as is.  Empty values are ignored.
+		"""
+		values = [value for value in values if value != '']
+		for converter in [int, float]:
+			try:
+				for value in values:
+					converter(value)
+				return converter if values else None
+			except ValueError:
+				continue
+
+		if values and all(value.lower() in ('true', 'false') for value in values):
+			return lambda value: {'true': True, 'false': False}[value.lower()]
+
+		return None
+
+
+	@staticmethod
+	def importColumns(content, columns=None, clean_name=False, skip_rows=0):
+		"""
+		importColumns(content, columns=None, clean_name=False, skip_rows=0) -- As importTabular(), but returns a table dictionary having a list of values per column, so a column can be addressed as table/column.  Only comma-separated columns given are kept (all if none given).  Each column's data type is picked once from its first rows, rather than per value, so e.g. every value of a float column is a float; a value that doesn't fit its column's type is parsed by parseDataType() as usual.  Use iterRows() for importTabular() style row dictionaries.
+		Content can also be an iterable of lines, e.g. from readFileByName().
+		"""
+		if isinstance(content, basestring):
+			content = content.split('\n')
+
+		if not hasattr(content, '__iter__'):
+			raise ValueError ("importColumns() didn't receive iterable text for input.")
+
+		if isinstance(columns, basestring):
+			columns = [column.strip() for column in columns.strip().strip(',').split(',')] if columns.strip() else None
+
+		lines = (line['value'] if isinstance(line, dict) else line for (row, line) in enumerate(content) if row >= skip_rows)
+		lines = (line.rstrip('\r') for line in lines if len(line) > 0)
+
+		table = OrderedDict()
+		for line in lines:
+			tableHeader = RCQCStaticFnExtension.__tableHeader__(line, clean_name)
+			break
+		else:
+			return table # No header, so no columns.
+
+		if columns is None:
+			columns = tableHeader
+		missing = [column for column in columns if not column in tableHeader]
+		if missing:
+			raise ValueError ('importColumns() has no column named %s in header: %s' % (', '.join(missing), ', '.join(tableHeader)) )
+
+		indexes = [tableHeader.index(column) for column in columns]
+		rows = ([cells[index] if index < len(cells) else '' for index in indexes] for cells in (line.split('\t') for line in lines))
+
+		# Pick each column's type from sample of first rows.
+		sample = list(itertools.islice(rows, TABULAR_SAMPLE_ROWS))
+		converters = [RCQCStaticFnExtension.__columnType__(values) for values in zip(*sample)] if sample else [None] * len(columns)
+		for column in columns:
+			table[column] = []
+		fields = zip(converters, [table[column].append for column in columns])
+
+		parseDataType = RCQCStaticFnExtension.parseDataType
+		for values in itertools.chain(sample, rows):
+			for ((converter, append), value) in itertools.izip(fields, values):
+				if converter is None:
+					append(parseDataType(value))
+					continue
+				try:
+					append(converter(value))
+				except (ValueError, KeyError):
+					append(parseDataType(value))
+
+		return table
+
+
+	@staticmethod
+	def iterRows(table):
+		"""
+		iterRows(table) -- Iterator that returns each row of an importColumns() table as a dictionary, as importTabular() would.
+		"""
+		columns = table.keys()
+		for (row, values) in enumerate(itertools.izip(*table.values())):
+			myDict = OrderedDict([('ROW', row)])
+			myDict.update(itertools.izip(columns, values))
+			yield myDict
+
+
+	@staticmethod
+	def __fastqcTable__(module, comments, rows):
+		"""
+		Adds FastQC module's "#" comment lines and data rows to module as typed columns and values dictionary, for fastqcModules().
+		"""
+		values = OrderedDict()
+		for comment in comments[0:-1]:
+			(key, value) = (comment.split('\t', 1) + [''])[0:2]
+			values[RCQCStaticFnExtension.nameCamelCase(key)] = RCQCStaticFnExtension.parseDataType(value.strip())
+
+		module['columns'] = RCQCStaticFnExtension.importColumns(comments[-1:] + rows, clean_name='camelCase') if comments else OrderedDict()
+		if module['columns'].keys() == ['measure', 'value']:
+			for (key, value) in itertools.izip(module['columns']['measure'], module['columns']['value']):
+				values[RCQCStaticFnExtension.nameCamelCase(str(key))] = value
+
+		if values:
+			module['values'] = values
+		return module
+
+
 	@staticmethod	
 	def exportTabular(content, label="", depth = 0): 
 		"""
 		exportTabular(content) -- export namespace (hierarchy) into tabular string format (rows end in carriage returns).
 		"""
-		output = ''
+		return ''.join(RCQCStaticFnExtension.iterTabular(content, label, depth))
+
+
+	@staticmethod	
+	def iterTabular(content, label="", depth = 0): 
+		"""
+		iterTabular(content) -- As exportTabular(), but yields one row at a time, so writeFile() can write a large namespace (hierarchy) to file as it goes.
+		"""
+		label = str(label)
 		
 		if isinstance(content, dict):
 			if len(label) >0 :
-				output = depth*'	'+str( label if depth !=1 else label.upper())+'\n'
+				yield depth*'	'+( label if depth !=1 else label.upper())+'\n'
 			# As with HTML display, put more complex items at bottom.
-			content_iterable = 	iter(sorted(content.items(), key=lambda (mykey, myvalue): hasattr(myvalue, '__iter__') )) 
+			content_iterable = itertools.chain(
+				((key, value) for (key, value) in content.iteritems() if not hasattr(value, '__iter__')),
+				((key, value) for (key, value) in content.iteritems() if hasattr(value, '__iter__')) )
 			for (key, value) in content_iterable:
-				output += RCQCStaticFnExtension.exportTabular(value, key, depth+1)
+				for row in RCQCStaticFnExtension.iterTabular(value, key, depth+1):
+					yield row
 		elif isinstance(content, list):
 			if len(label) >0 :
-				output = depth*'	'+str(label if depth !=1 else label.upper())+'\n'
+				yield depth*'	'+( label if depth !=1 else label.upper())+'\n'
 			for ptr, item in enumerate(content):
-				output += RCQCStaticFnExtension.exportTabular(item, ptr, depth+1)
+				for row in RCQCStaticFnExtension.iterTabular(item, ptr, depth+1):
+					yield row
 		else:
-			output = depth*'	'+str(label)+'	'+ str(content) + '\n'
-			
-		return output
+			yield depth*'	'+label+'	'+ str(content) + '\n'
 			
 	@staticmethod
 	def format(myFormatString, dictOrValues):
@@ -648,7 +1204,62 @@ class RCQCStaticFnExtension(object):
 				yield {'value': subject[ startPtr : endPtr -1] } 
 				startPtr = subject.find(start_phrase, startPtr)
 			else:
-				startPtr == -1
+				break # No end to this or any later section.
+
+
+	@staticmethod
+	def sections(subjects, markers, end_phrase=None):
+		"""
+		sections(text, markers, end_phrase=None) -- As section(), but finds sections for many start/end phrase pairs in one pass through text.  Markers is a dictionary of start phrase: end phrase, or a list of [start phrase, end phrase] pairs, or with end_phrase given, a list of start phrases.
+		Each section is returned as a dictionary having name (its start phrase), start and end offsets of text between its phrases, and value: that text as a read-only buffer onto original text, which regexp() can search without it being copied.  As in section(), text stops one character short of end phrase (usually leaving out the line break before it).
+		Phrases are matched left to right (longest first) without overlapping each other, and sections are returned in order of their end.  A phrase can end one section and start another.  Text can also be a memory mapped file from mmapFileByName().
+		"""
+		if isinstance(markers, dict):
+			pairs = markers.items()
+		elif isinstance(markers, basestring):
+			pairs = [(markers, end_phrase)]
+		elif end_phrase is not None:
+			pairs = [(start, end_phrase) for start in markers]
+		else:
+			pairs = [tuple(pair) for pair in markers]
+
+		starts = {} # End phrases of each start phrase
+		for (start, end) in pairs:
+			if not start or not end:
+				raise ValueError ("sections() needs a start and end phrase for each section.")
+			starts.setdefault(start, []).append(end)
+		if not starts:
+			return
+
+		phrases = sorted(set(starts.keys() + [end for (start, end) in pairs]), key=len, reverse=True)
+		regex = RCQCStaticFnExtension.getRegExp('|'.join(re.escape(phrase) for phrase in phrases))
+
+		if isinstance(subjects, (basestring, mmap.mmap, bytearray, buffer)) or not hasattr(subjects, '__iter__'):
+			subjects = [subjects]
+
+		row = 0
+		for subject in subjects:
+			if isinstance(subject, dict) and 'value' in subject:
+				subject = subject['value']
+			if not isinstance(subject, (basestring, mmap.mmap, bytearray, buffer)):
+			 	raise ValueError ( "sections() didn't receive a string to search.")
+
+			waiting = {} # (start phrase, offset) of sections waiting for each end phrase
+			for match in regex.finditer(subject):
+				phrase = match.group()
+				if isinstance(phrase, bytearray):
+					phrase = str(phrase)
+				if phrase in waiting:
+					for (start, offset) in waiting.pop(phrase):
+						end = max(offset, match.start() - 1)
+						myDict = {'name': start, 'start': offset, 'end': end, 'ROW': row}
+						# Unicode has no buffer of its characters, so is sliced.
+						myDict['value'] = subject[offset : end] if isinstance(subject, unicode) else buffer(subject, offset, end - offset)
+						row += 1
+						yield myDict
+
+				for end in starts.get(phrase, []):
+					waiting.setdefault(end, []).append( (phrase, match.end()) )
 
 
 ######################### FUNCTION EXTENSIONS THAT NEED RCQC SELF #######################
@@ -669,16 +1280,21 @@ class RCQCClassFnExtension(object):
 		or it is a x/y/z path where x/y could already exist in namespace, and z is a new key.  Or x/y is new too.
 		"""
 		
+		home = None # (id(dictionary), key) of location if known, for parallelIterate() changes.
 		if isinstance(location, basestring):
 
 			#location = self.callerInstance.namespaceSearchReplace(location)
 			(obj, key) = self.callerInstance.getNamespace(location)
+			home = (id(obj), key)
 			if not key in obj: #Note, if key happens to be in obj but isn't a list that will cause problems.
 				obj[key] = []
 				print "append() setting up array for /" + key
-				self.callerInstance.namespace['name_index'][key] = obj  
+				self.callerInstance.indexNickname(key, obj)
 			location = obj[key] # Should be dictionary or array here.
 
+		if self.callerInstance.appended_lists is not None and isinstance(location, list): # In a parallelIterate() worker.
+			self.callerInstance.appended_lists.add(home or id(location))
+
 		if  hasattr(expression, '__iter__'):
 			value = None # might be empty iterator
 			for item in expression: 
@@ -686,6 +1302,7 @@ class RCQCClassFnExtension(object):
 				# append one dictionary onto another = copy
 				if isinstance(location, dict): # CHECK IF Expression is dict too?
 					location[item] = expression[item]
+					self.callerInstance.setNickname(location, item)
 					continue	
 				elif isinstance(item, dict) and 'value' in item:
 					location.append(item['value'])
@@ -733,11 +1350,12 @@ class RCQCClassFnExtension(object):
 			if isinstance(location, basestring): # It should always be this.
 				(obj, key) = self.callerInstance.getNamespace(location)
 				obj[key] = myDict
-				self.callerInstance.namespace['name_index'][key] = obj  #abbreviated name
+				self.callerInstance.indexNickname(key, obj)  #abbreviated name
 			
 			if DEBUG > 0: print 'Iterator/%s:' % fnDepth, self.callerInstance.namespace['iterator'][fnDepth], functions
 			self.callerInstance.evaluateAuxFunctions(functions)
 
+		self.callerInstance.rows_iterated += found
 		if  found ==0: 
 			print "Note, no iterations to do. "
 			return False		
@@ -745,6 +1363,47 @@ class RCQCClassFnExtension(object):
 		return True
 		
 		
+	def parallelIterate(self, iterator, location, *functions):
+		"""
+		parallelIterate (iterator location fn1 ... fn2 etc.) -- As iterate(), but each iteration runs in a separate worker process (at most -P of them) with its own copy of namespace.  Only changes to the report/ namespace are kept; they are merged back in iterator order.  Suited to independent work per input file.
+		"""
+		# Catch non-iterables
+		if not (hasattr(iterator, '__iter__') or isinstance(iterator, (dict, list)) ):
+			raise ValueError ("parallelIterate() didn't receive an iterator for input.")
+
+		global PARALLEL_ITERATE
+		items = list(iterator)
+		options = self.callerInstance.options
+		processes = min(options.processes if options and options.processes else multiprocessing.cpu_count(), len(items))
+		if processes <= 1 or PARALLEL_ITERATE is not None: # Nested parallelIterate() calls run in their worker process.
+			return self.iterate(items, location, *functions)
+
+		PARALLEL_ITERATE = (self, items, location, functions)
+		try:
+			pool = multiprocessing.Pool(processes)
+			try:
+				results = pool.map(parallelIterateWorker, range(len(items)), 1)
+			finally:
+				pool.terminate()
+		finally:
+			PARALLEL_ITERATE = None
+
+		self.callerInstance.rows_iterated += len(items)
+		for changes in results:
+			applyReportChanges(self.callerInstance, self.callerInstance.namespace['report'], changes)
+
+		# As after iterate(), location and iterator dictionary hold last item.
+		fnDepth = str(len(self.callerInstance.function_stack)-1)
+		self.callerInstance.namespace['iterator'][fnDepth] = items[-1]
+		if isinstance(location, basestring):
+			(obj, key) = self.callerInstance.getNamespace(location)
+			obj[key] = items[-1]
+			self.callerInstance.indexNickname(key, obj)  #abbreviated name
+
+		print "parallelIterate() done ", len(items), " times in ", processes, " processes."
+		return True
+
+
 	def iterMap(self, iterator, functionName):
 		"""
 		iterMap(iterator, function) -- Given function should be applied to each iterator dictionary's 'value' key, and result returned.  Works with functions that have 2 parameters.
@@ -768,38 +1427,43 @@ class RCQCClassFnExtension(object):
  	def iStatBP(self, location, fastaRow):
 		"""
 		iStatBP(statsDict, fastaRow) -- At statsDict location, builds a list of base-pair related statistics for subsequent rows of fasta sequence data.  This "inplace" function uses statsDict in situ, so does a running total on its various stats. 
+		fastaRow can also be an iterable of rows (e.g. from readFileByName()), in which case all rows are counted in bulk, and percentages are calculated once at end.
 			
 		Future: 'GATTCA' type buckets		
 		"""	
-
- 		if len(fastaRow) >0:
- 			if not isinstance(location, dict):
- 				if isinstance(location, basestring):
-					(obj, key) = self.callerInstance.getNamespace(location)
-					location = obj[key] # by reference
-				else:
-					raise ValueError ("Error: iStatBP() function wasn't given a good location for first parameter: %s" % location)
- 		
-			buckets = ['G','C','A','T']
-			if not 'A' in location: #indicates it hasn't been initialized.
-				#obj[key] = OrderedDict()
-				for item in buckets:
-					location[item]=0
-				location['total'] = 0
-			
-			#Tally buckets.  Allows for N ,U, * etc. to be identified
-			for char in fastaRow:
-				char = char.upper()
-				location[char] = (location[char] + 1) if char in location else 1 
-
-			location['total'] += len(fastaRow)
-			#Might not be at last line but calculate these anyways, in case we are:
-			for item in buckets:
-				location[item + '%'] = int(round(100*operator.truediv(location[item], location['total'] ) ))
-				
-			location['GC_content%'] = int(round(100*operator.truediv(location['G'] + location['C'], location['total'] )) )
+		if isinstance(fastaRow, basestring):
+			if len(fastaRow) == 0:
+				return location
+			rows = [fastaRow]
+		elif hasattr(fastaRow, '__iter__'):
+			rows = fastaRow
+		else:
+			raise ValueError ("Error: iStatBP() function wasn't given fasta sequence text or an iterable of it: %s" % fastaRow)
 			
-		return location
+		if not isinstance(location, dict):
+			if isinstance(location, basestring):
+				(obj, key) = self.callerInstance.getNamespace(location)
+				location = obj[key] # by reference
+			else:
+				raise ValueError ("Error: iStatBP() function wasn't given a good location for first parameter: %s" % location)
+
+		#Tally buckets.  Allows for N ,U, * etc. to be identified.  Rows are counted in blocks rather than character by character.
+		counts = OrderedDict()
+		block = []
+		block_size = 0
+		for row in rows:
+			if isinstance(row, dict):
+				row = row['value']
+			block.append(row)
+			block_size += len(row)
+			if block_size >= 1048576:
+				RCQCStaticFnExtension.__tallyBases__(counts, ''.join(block))
+				block = []
+				block_size = 0
+		if block:
+			RCQCStaticFnExtension.__tallyBases__(counts, ''.join(block))
+
+		return RCQCStaticFnExtension.__baseStats__(counts, location)
  
  
 	def clear(self, location):
@@ -850,6 +1514,96 @@ class RCQCClassFnExtension(object):
 			stop_err (error_text )
 
 
+	def __fileCacheKey__(self, path):
+		"""
+		Returns FILE_CACHE key of input file: (absolute path, size, modification time).  A missing file raises IOError, as opening it would.
+		"""
+		try:
+			stat = os.stat(path)
+		except OSError as e:
+			raise IOError(e.errno, e.strerror, path)
+		return (os.path.abspath(path), stat.st_size, stat.st_mtime)
+
+
+	def __cachedFile__(self, path, whole=False):
+		"""
+		Returns content of input file from FILE_CACHE, reading it in first if need be, or None if caller should read file from disk itself.  Least recently used contents are dropped to make room.
+		A file is read into cache when caller needs its entire content anyway (whole=True), or when it is streamed a second time; a file streamed just once (e.g. by readFileByName()) isn't held in memory.  A file larger than cache (--file_cache megabytes) isn't cached, nor is a compressed file being streamed, since its decompressed size isn't known until it has all been read.  With whole=True, a compressed file's decompressed content is returned even if it is too large to cache.
+		"""
+		options = self.callerInstance.options
+		cache_size = options.file_cache_size * 1048576 if options and options.file_cache_size is not None else FILE_CACHE_SIZE
+		key = self.__fileCacheKey__(path)
+
+		content = FILE_CACHE.pop(key, None)
+		if content is not None:
+			FILE_CACHE_STATS['hits'] += 1
+			FILE_CACHE_STATS['bytes_saved'] += key[1]
+			FILE_CACHE[key] = content # Now most recently used.
+			return content
+
+		if not whole and key not in FILE_CACHE_SEEN:
+			FILE_CACHE_SEEN[key] = True
+			if len(FILE_CACHE_SEEN) > FILE_CACHE_SEEN_SIZE:
+				FILE_CACHE_SEEN.popitem(False)
+			return None
+
+		compression = getCompression(path)
+		if (compression and not whole) or (key[1] > cache_size and not compression):
+			return None
+
+		FILE_CACHE_STATS['misses'] += 1
+		self.callerInstance.bytes_read += key[1]
+		if compression:
+			with self.__openCompressedFile__(path, compression) as file_handle:
+				content = file_handle.read()
+			if len(content) > cache_size:
+				return content
+		else:
+			with open(path, 'r') as file_handle:
+				content = file_handle.read()
+
+		while FILE_CACHE and FILE_CACHE_STATS['bytes'] + len(content) > cache_size:
+			FILE_CACHE_STATS['bytes'] -= len(FILE_CACHE.popitem(False)[1])
+		FILE_CACHE_STATS['bytes'] += len(content)
+		FILE_CACHE[key] = content
+		return content
+
+
+	def __readFile__(self, path):
+		"""
+		Returns entire content of input file, decompressed if need be, via file cache.
+		"""
+		content = self.__cachedFile__(path, True)
+		if content is None: # Larger than cache.
+			self.callerInstance.bytes_read += os.path.getsize(path)
+			with open(path, 'r') as file_handle:
+				content = file_handle.read()
+		return content
+
+
+	def __openFile__(self, path):
+		"""
+		Returns file object for reading lines of input file in a "with" statement, via file cache.  A file that isn't cached is read from disk as usual, and a gzip, bz2 or xz compressed one is decompressed as it is read.
+		"""
+		content = self.__cachedFile__(path)
+		if content is not None:
+			return contextlib.closing(cStringIO.StringIO(content))
+
+		self.callerInstance.bytes_read += os.path.getsize(path)
+		compression = getCompression(path)
+		if compression:
+			return self.__openCompressedFile__(path, compression)
+		return open(path, 'r', INPUT_BUFFER_SIZE)
+
+
+	def __openCompressedFile__(self, path, compression):
+		"""
+		Returns CompressedFile for path, decompressing in a background thread if --decompress_thread is given.
+		"""
+		options = self.callerInstance.options
+		return CompressedFile(path, compression, bool(options and options.decompress_thread))
+
+
 	def loadFileByName(self, file_name):	
 		"""
 		loadFileByName(file_name) -- Iterator that returns (in a dictionary) entire contents of each file matching file_name.
@@ -857,19 +1611,39 @@ class RCQCClassFnExtension(object):
 		"""
 		found = False
 		for myFile in self.iterFiles(file_name):
-			data = None
 			ptr = 0
-			with open(myFile['value'], 'r') as input_file_handle:
-				found = True
-				if myFile['type'] == "json":	
-					data = json.load(input_file_handle, object_pairs_hook=OrderedDict)
-				else:		
-					# Text and tab-delimited		
-					data = input_file_handle.read()
-	
-				print "Loaded %s: %s characters" % (myFile['name'], len(data) )
-				yield {'value': data , 'ROW': ptr, 'name': myFile['name'] }
-				ptr = ptr + 1
+			found = True
+			data = self.__readFile__(myFile['value'])
+			if myFile['type'] == "json":	
+				data = json.loads(data, object_pairs_hook=OrderedDict)
+			# else text and tab-delimited
+
+			print "Loaded %s: %s characters" % (myFile['name'], len(data) )
+			yield {'value': data , 'ROW': ptr, 'name': myFile['name'] }
+			ptr = ptr + 1
+
+
+	def mmapFileByName(self, file_name):
+		"""
+		mmapFileByName(file_name) -- Iterator that returns (in a dictionary) a read-only memory map of entire contents of each file matching file_name.  regexp() and section() can search it without file content being read into memory first.
+		A compressed file can't be searched in place, so its decompressed content is returned instead.
+		File must be supplied in input list.
+		"""
+		for ptr, myFile in enumerate(self.iterFiles(file_name)):
+			if getCompression(myFile['value']):
+				data = self.__readFile__(myFile['value'])
+			else:
+				with open(myFile['value'], 'rb') as input_file_handle:
+					self.callerInstance.bytes_read += os.fstat(input_file_handle.fileno()).st_size
+					# An empty file can't be mapped.  Map stays open after file handle is closed, until job finishes.
+					if os.fstat(input_file_handle.fileno()).st_size == 0:
+						data = ''
+					else:
+						data = mmap.mmap(input_file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+						self.callerInstance.file_maps.append(data)
+
+			print "Mapped %s: %s characters" % (myFile['name'], len(data) )
+			yield {'value': data , 'ROW': ptr, 'name': myFile['name'] }
 
 
 	def readFileByName(self, entity):
@@ -883,19 +1657,126 @@ class RCQCClassFnExtension(object):
 		"""
 		found = False
 		for myFile in (self.iterFiles(entity) if isinstance(entity, basestring) else ([entity] if isinstance(entity, dict) else entity)):
-			with open(myFile['value'],'r') as file_handle:
+			with self.__openFile__(myFile['value']) as file_handle:
 				found = True
 				print "READING: ", myFile['value']
 				for ptr,line in enumerate(file_handle):
 					yield {'value': line.strip('\n') , 'ROW': ptr, 'name': myFile['name'] }
 
 
+	def fastaStats(self, entity, header_regex, min_length=0):
+		"""
+		fastaStats(file, header_regex, min_length=0) -- Reads fasta file(s) in one pass, returning contig statistics: basepairs (as per iStatBP), id, contig_lengths, min_contig_length, max_contig_length, assembly_genome_size, contig_count, cut_contig_count and cut_contig% .
+		Each >header line is matched by header_regex; its (?P<value>...) group is contig length, and optional (?P<id>...) group is assembly id.  Group types can be declared as for regexp(), e.g. (?P<value__int>...).  Contigs shorter than min_length are counted as cut, and their sequence isn't counted.
+		File is given as for readFileByName().
+		"""
+		header_regex = RCQCStaticFnExtension.getRegExp(header_regex)
+		groupTypes = RCQCStaticFnExtension.__regExpGroupTypes__(header_regex)
+
+		contig_lengths = []
+		cut_contig_count = 0
+		assembly_id = None
+		counts = OrderedDict()
+
+		for myFile in (self.iterFiles(entity) if isinstance(entity, basestring) else ([entity] if isinstance(entity, dict) else entity)):
+			with self.__openFile__(myFile['value']) as file_handle:
+				print "READING: ", myFile['value']
+				process_fasta = False
+				sequence = [] # Lines of current contig, tallied as one block when contig ends.
+				for line in file_handle:
+					if line[0:1] == '>':
+						if sequence:
+							RCQCStaticFnExtension.__tallyBases__(counts, ''.join(sequence))
+							sequence = []
+
+						process_fasta = False
+						for myNextItem in header_regex.finditer(line.strip('\n')):
+							myDict = myNextItem.groupdict()
+							if groupTypes:
+								RCQCStaticFnExtension.__typeGroups__(myDict, groupTypes)
+							contig_length = RCQCStaticFnExtension.parseDataType(myDict.get('value', ''))
+							if contig_length >= min_length:
+								process_fasta = True
+								assembly_id = myDict.get('id', assembly_id)
+								contig_lengths.append(contig_length)
+							else:
+								cut_contig_count += 1
+
+					elif process_fasta:
+						sequence.append(line.strip('\n'))
+
+				if sequence:
+					RCQCStaticFnExtension.__tallyBases__(counts, ''.join(sequence))
+
+		contig_lengths.sort()
+		contig_count = len(contig_lengths)
+
+		data = OrderedDict()
+		data['basepairs'] = RCQCStaticFnExtension.__baseStats__(counts)
+		if assembly_id is not None:
+			data['id'] = assembly_id
+		data['contig_lengths'] = contig_lengths
+		data['min_contig_length'] = contig_lengths[0] if contig_count else None
+		data['max_contig_length'] = contig_lengths[-1] if contig_count else None
+		data['assembly_genome_size'] = int(round(math.fsum(contig_lengths)))
+		data['contig_count'] = contig_count
+		data['cut_contig_count'] = cut_contig_count
+		data['cut_contig%'] = int(round(operator.truediv(cut_contig_count, contig_count + cut_contig_count) * 100)) if contig_count + cut_contig_count else 0
+		return data
+
+
+	def fastqcModules(self, entity):
+		"""
+		fastqcModules(file) -- Reads FastQC report (fastqc_data.txt) in one pass, returning its FastQC version, and each >>Module ... >>END_MODULE block by camelCase name (e.g. perBaseSequenceQuality), with its name, state (pass, warn or fail) and table as typed columns, e.g. modules/perBaseSequenceQuality/columns/mean .
+		Column names are camelCase too.  Module "#Measure Value" tables (e.g. basicStatistics), and "#" lines above a module's column header (e.g. #Total Deduplicated Percentage), are also given as module's values dictionary.
+		File is given as for readFileByName(), and must match only one file.
+		"""
+		files = list(self.iterFiles(entity) if isinstance(entity, basestring) else ([entity] if isinstance(entity, dict) else entity))
+		if len(files) != 1:
+			raise ValueError ('fastqcModules() needs one FastQC report file, but got %s.' % len(files))
+
+		data = OrderedDict()
+		data['version'] = None
+		data['modules'] = OrderedDict()
+		module = None
+
+		with self.__openFile__(files[0]['value']) as file_handle:
+			print "READING: ", files[0]['value']
+			for line in file_handle:
+				line = line.rstrip('\r\n')
+				if line[0:2] == '>>':
+					if line == '>>END_MODULE':
+						if module is not None:
+							RCQCStaticFnExtension.__fastqcTable__(module, comments, rows)
+							module = None
+					else:
+						(name, state) = (line[2:].split('\t', 1) + [''])[0:2]
+						module = OrderedDict()
+						module['name'] = name
+						module['state'] = state.strip()
+						data['modules'][RCQCStaticFnExtension.nameCamelCase(name)] = module
+						comments = [] # "#" lines; last one before data is column header.
+						rows = []
+
+				elif module is None:
+					if line[0:8] == '##FastQC':
+						data['version'] = line[8:].strip()
+
+				elif line[0:1] == '#' and not rows:
+					comments.append(line[1:])
+
+				elif len(line) > 0:
+					rows.append(line)
+
+		return data
+
+
 	def writeJsonFile(self, content, output_file_name):
 		"""
 		writeJsonFile(content, file_name) -- Writes given content as JSON to file_name in tool's output folder.  A link to file is provided on tool's HTML report output page.
 		"""
-		content = json.dumps(content, sort_keys=True, indent=4, separators=(',', ': '), default=lambda: "[unprintable iterable]")
-		writeFile(self, content, output_file_name)
+		encoder = json.JSONEncoder(sort_keys=True, indent=4, separators=(',', ': '), default=lambda obj: "[unprintable iterable]")
+		self.writeFile(encoder.iterencode(content), output_file_name)
 
 		
 	def writeFile(self, content, output_file_name):
@@ -911,7 +1792,7 @@ class RCQCClassFnExtension(object):
 			if not os.path.exists(outputdir): 
 				os.makedirs(outputdir)
 
-			with (open(output_path,'w')) as output_handle:
+			with (open(output_path,'w', 1048576)) as output_handle:
 				# Test if content is an iterable list:
 				#for line in location:
 			
@@ -922,7 +1803,7 @@ class RCQCClassFnExtension(object):
 							output_handle.write( key + '\t' + str(val) + '\n')
 					else:
 						for item in content:
-							output_handle.write(item['value'])
+							output_handle.write(item if isinstance(item, basestring) else item['value'])
 				else:
 					output_handle.write(content)
 					
@@ -931,21 +1812,6 @@ class RCQCClassFnExtension(object):
 			print "OS error({0}): {1}. Tried to write to {2}".format(e.errno, e.strerror, output_path)
 			raise e
 			
-"""
-POSSIBLE "LARGE FILE" REGEX IMPROVEMENT
-import mmap
-import re
-import contextlib
-
-pattern = re.compile(r'(\.\W+)?([^.]?nulla[^.]*?\.)',
-                     re.DOTALL | re.IGNORECASE | re.MULTILINE)
-
-with open('lorem.txt', 'r') as f:
-    with contextlib.closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as m:
-        for match in pattern.findall(m):
-            print match[1].replace('\n', ' ')
-"""
-
 """
 ADD MORE FILE INFO
 